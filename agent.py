@@ -0,0 +1,116 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import google.generativeai as genai
+import metrics
+
+# ==========================================
+# 도구 실행 루프: 한 응답의 function call 을 모두 모아 병렬 실행 -> 결과를 한 메시지로 회신
+# ==========================================
+
+# 도구 실행용 공용 워커 풀 (Streamlit 재실행마다 새로 만들지 않음)
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="jarvis-tool")
+
+# 응답에 들어 있는 function call 전부 (없으면 빈 리스트)
+def function_calls(response):
+    if not response.candidates: return []
+    return [p.function_call for p in response.parts if p.function_call and p.function_call.name]
+
+def _run(func, name, args):
+    t = time.perf_counter()
+    try:
+        result = func(**args) if func else "Error: 도구 없음"
+    except Exception as e:
+        result = f"Error: {e}"
+    return name, result, (time.perf_counter() - t) * 1000, func is not None
+
+# 도구 호출을 받는 즉시 풀에 넣는 실행기. resource_of(이름, 인자) 가 같은 호출끼리는 앞 호출이 끝난 뒤 순서대로,
+# 다른 묶음끼리는 동시에 실행 (같은 묶음의 앞 호출은 항상 먼저 제출되므로 풀 안에서 기다려도 교착되지 않음)
+class Dispatcher:
+    def __init__(self, tool_map, resource_of=None):
+        self.tool_map = tool_map
+        self.resource_of = resource_of
+        self.calls = []    # [(이름, 인자, future)]
+        self._last = {}    # 묶음 키 -> 마지막 future
+
+    def submit(self, name, args):
+        key = self.resource_of(name, args) if self.resource_of else len(self.calls)
+        prev = self._last.get(key)
+        future = _pool.submit(self._run_after, prev, self.tool_map.get(name), name, args)
+        self._last[key] = future
+        self.calls.append((name, args, future))
+
+    @staticmethod
+    def _run_after(prev, func, name, args):
+        if prev: wait([prev])
+        return _run(func, name, args)
+
+    def __len__(self):
+        return len(self.calls)
+
+    # [(이름, 결과, 소요 ms, 실행 여부)] (제출 순서 유지). timeout 안에 못 끝난 호출은 실패로 알리고 풀에서 마저 끝나도록 둠
+    def results(self, timeout=60):
+        wait([f for _, _, f in self.calls], timeout=timeout)
+        return [f.result() if f.done() else (name, "Error: 시간 초과", timeout * 1000, False) for name, _, f in self.calls]
+
+# calls: [(이름, 인자 dict)] -> [(이름, 결과, 소요 ms, 실행 여부)]
+def execute_calls(calls, tool_map, resource_of=None, timeout=60):
+    dispatcher = Dispatcher(tool_map, resource_of)
+    for name, args in calls: dispatcher.submit(name, args)
+    return dispatcher.results(timeout)
+
+def function_response_content(results):
+    return genai.protos.Content(parts=[
+        genai.protos.Part(function_response=genai.protos.FunctionResponse(name=name, response={"result": result}))
+        for name, result, _, _ in results
+    ])
+
+def _collect(results, executed, tool_timings):
+    for name, result, ms, ran in results:
+        if ran: executed.append(result)
+        tool_timings.append((name, ms))
+
+# parts 를 보내고, 응답에 도구 호출이 없어질 때까지(최대 max_iters 회) 실행/회신 반복
+# 반환: (최종 응답, 실행된 도구 결과 리스트, [(도구 이름, 소요 ms)])
+def run_turn(chat, parts, tool_map, resource_of=None, max_iters=5, timeout=60, on_call=None):
+    with metrics.track("gemini", "send_message"):
+        response = chat.send_message(parts)
+    executed, tool_timings = [], []
+    for _ in range(max_iters):
+        calls = [(fc.name, dict(fc.args)) for fc in function_calls(response)]
+        if not calls: break
+        if on_call:
+            for name, args in calls: on_call(name, args)
+        results = execute_calls(calls, tool_map, resource_of, timeout)
+        _collect(results, executed, tool_timings)
+        with metrics.track("gemini", "send_message"):
+            response = chat.send_message(function_response_content(results))
+    return response, executed, tool_timings
+
+# 스트리밍 버전: 텍스트 조각은 도착하는 대로 on_text 로 넘기고, 도구 호출은 응답이 끝나기 전에 바로 실행 시작
+# 반환: (전체 텍스트, 실행된 도구 결과 리스트, [(도구 이름, 소요 ms)], {"ttft_ms", "total_ms"})
+def run_turn_stream(chat, parts, tool_map, resource_of=None, max_iters=5, timeout=60, on_call=None, on_text=None):
+    start = time.perf_counter()
+    ttft = None
+    text, executed, tool_timings = "", [], []
+    message = parts
+    for i in range(max_iters + 1):
+        dispatcher = Dispatcher(tool_map, resource_of)
+        with metrics.track("gemini", "send_message_stream"):
+            for chunk in chat.send_message(message, stream=True):
+                if ttft is None: ttft = (time.perf_counter() - start) * 1000
+                if not chunk.candidates: continue
+                for part in chunk.parts:
+                    if part.function_call and part.function_call.name:
+                        fc = part.function_call
+                        if on_call: on_call(fc.name, dict(fc.args))
+                        dispatcher.submit(fc.name, dict(fc.args))
+                    elif part.text:
+                        text += part.text
+                        if on_text: on_text(part.text)
+        if not len(dispatcher): break
+        results = dispatcher.results(timeout)
+        _collect(results, executed, tool_timings)
+        if i == max_iters: break # 이미 시작된 도구는 결과만 모으고 더 이상 모델에 회신하지 않음
+        message = function_response_content(results)
+    total = (time.perf_counter() - start) * 1000
+    return text, executed, tool_timings, {"ttft_ms": ttft if ttft is not None else total, "total_ms": total}
@@ -0,0 +1,164 @@
+import datetime
+import difflib
+import threading
+from collections import defaultdict
+import numpy as np
+import workout
+
+# ==========================================
+# 운동 기록 열 저장소: 모든 부위 시트의 세트를 열(배열) 단위로 한곳에 보관
+# 최초 1회만 시트를 읽고, 이후는 log_workout 기록을 한 행씩 추가 (종목별/날짜별 인덱스로 메모리 안에서 조회)
+# ==========================================
+
+_FLOAT_COLS = ("sets", "weight", "reps", "volume", "e1rm")
+
+def _ordinal(text):
+    try: return datetime.date.fromisoformat(text.strip()[:10]).toordinal()
+    except (ValueError, AttributeError): return None
+
+class WorkoutStore:
+    def __init__(self, capacity=1024):
+        self.n = 0
+        self.date = np.zeros(capacity, dtype=np.int32)      # date.toordinal()
+        self.sheet = np.zeros(capacity, dtype=np.int16)     # sheet_names 번호
+        self.exercise = np.zeros(capacity, dtype=np.int32)  # exercise_names 번호
+        for col in _FLOAT_COLS: setattr(self, col, np.full(capacity, np.nan))
+        self.sheet_names, self._sheet_ids = [], {}
+        self.exercise_names, self._exercise_ids = [], {}
+        self.by_exercise = defaultdict(list) # 종목 번호 -> 행 위치
+        self.by_date = defaultdict(list)     # 날짜 서수 -> 행 위치
+        self.loaded_sheets = ()              # load 로 읽은 시트 (원격 변경 시 저장소를 다시 만들 대상)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, db, sheets=None):
+        store = cls()
+        store.loaded_sheets = tuple(sheets or workout.ALL_SHEETS)
+        for sheet in store.loaded_sheets:
+            try: rows = db.get_all_values(sheet)
+            except Exception: continue
+            store.add_rows(sheet, rows[1:])
+        return store
+
+    def _code(self, names, ids, name):
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    def _grow(self, need):
+        cap = len(self.date)
+        if need <= cap: return
+        while cap < need: cap *= 2
+        for col in ("date", "sheet", "exercise") + _FLOAT_COLS:
+            old = getattr(self, col)
+            new = np.full(cap, np.nan) if old.dtype.kind == "f" else np.zeros(cap, dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, col, new)
+
+    # 시트 행들 ([날짜, 종목, 세트, 무게, 횟수, ...]) 추가 - 볼륨/1RM 은 workout.compute_stats 로 한 번에 계산
+    def add_rows(self, sheet, rows):
+        rows = [r + [""] * (5 - len(r)) for r in rows]
+        rows = [(d, r) for d, r in ((_ordinal(r[0]), r) for r in rows) if d is not None and r[1].strip()]
+        if not rows: return 0
+        body = [r for _, r in rows]
+        vol, e1rm, valid = workout.compute_stats([r[3] for r in body], [r[4] for r in body])
+        with self.lock:
+            start, end = self.n, self.n + len(rows)
+            self._grow(end)
+            sheet_id = self._code(self.sheet_names, self._sheet_ids, sheet)
+            self.date[start:end] = [d for d, _ in rows]
+            self.sheet[start:end] = sheet_id
+            self.exercise[start:end] = [self._code(self.exercise_names, self._exercise_ids, r[1].strip()) for r in body]
+            self.sets[start:end] = workout.parse_column([r[2] for r in body])
+            self.weight[start:end] = workout.parse_column([r[3] for r in body])
+            self.reps[start:end] = workout.parse_column([r[4] for r in body])
+            self.volume[start:end] = np.where(valid, vol, 0.0)
+            self.e1rm[start:end] = np.where(valid, e1rm, np.nan)
+            for pos in range(start, end):
+                self.by_exercise[int(self.exercise[pos])].append(pos)
+                self.by_date[int(self.date[pos])].append(pos)
+            self.n = end
+        return len(rows)
+
+    def __len__(self):
+        return self.n
+
+    # 종목 이름 -> 저장소의 종목 이름 (정확히 -> 포함 -> 유사도) 또는 None
+    def match_exercise(self, name):
+        key = (name or "").replace(" ", "").lower()
+        if not key: return None
+        names = {n.replace(" ", "").lower(): n for n in self.exercise_names}
+        if key in names: return names[key]
+        for k, n in sorted(names.items(), key=lambda kv: len(kv[0])):
+            if key in k or k in key: return n
+        close = difflib.get_close_matches(key, names, n=1, cutoff=0.6)
+        return names[close[0]] if close else None
+
+    def _select(self, positions, since=None):
+        pos = np.asarray(positions, dtype=np.int64)
+        if since is not None and len(pos): pos = pos[self.date[pos] >= since.toordinal()]
+        return pos
+
+    # 종목별 날짜 추이: [{"date", "sets", "top_weight", "best_e1rm", "volume"}] (날짜순)
+    def exercise_history(self, name, since=None):
+        with self.lock:
+            ex = self._exercise_ids.get(name)
+            if ex is None: return []
+            pos = self._select(self.by_exercise[ex], since)
+            if not len(pos): return []
+            pos = pos[np.argsort(self.date[pos], kind="stable")]
+            dates, weight, e1rm, volume = self.date[pos], self.weight[pos], self.e1rm[pos], self.volume[pos]
+            sets = np.nan_to_num(self.sets[pos], nan=1.0)
+        # 날짜별 구간 합/최댓값을 한 번에 (fmax 는 nan 을 무시)
+        days, starts = np.unique(dates, return_index=True)
+        set_sum, vol_sum = np.add.reduceat(sets, starts), np.add.reduceat(volume, starts)
+        top, best = np.fmax.reduceat(weight, starts), np.fmax.reduceat(e1rm, starts)
+        return [{
+            "date": datetime.date.fromordinal(int(d)).isoformat(), "sets": int(n),
+            "top_weight": float(w) if np.isfinite(w) else None,
+            "best_e1rm": round(float(b), 1) if np.isfinite(b) else None,
+            "volume": int(v),
+        } for d, n, w, b, v in zip(days, set_sum, top, best, vol_sum)]
+
+    # 기간 [since, until] 행들의 열 사본 {"date", "sheet", "exercise", "sets", "volume", "e1rm"} + 부위/종목 이름 (since=None 이면 처음부터)
+    def window(self, since, until):
+        with self.lock:
+            date = self.date[:self.n]
+            m = date <= until.toordinal()
+            if since is not None: m &= date >= since.toordinal()
+            cols = {col: getattr(self, col)[:self.n][m] for col in ("date", "sheet", "exercise", "sets", "volume", "e1rm")}
+            return cols, list(self.sheet_names), list(self.exercise_names)
+
+    # 최근 weeks주 부위별 볼륨: [(주 시작일, {부위: 볼륨})] (월요일 시작, 오래된 주부터)
+    def weekly_volume(self, weeks=8, end=None):
+        end = end or datetime.date.today()
+        first = end - datetime.timedelta(days=end.weekday() + 7 * (weeks - 1))
+        cols, names, _ = self.window(first, end)
+        totals = np.zeros((weeks, max(1, len(names))))
+        np.add.at(totals, ((cols["date"] - first.toordinal()) // 7, cols["sheet"]), cols["volume"])
+        return [((first + datetime.timedelta(weeks=w)).isoformat(), {names[s]: int(totals[w, s]) for s in range(len(names)) if totals[w, s]})
+                for w in range(weeks)]
+
+    # 특정 날짜의 세트 목록
+    def day(self, date):
+        with self.lock:
+            pos = self.by_date.get(date.toordinal(), [])
+            return [{"sheet": self.sheet_names[self.sheet[p]], "exercise": self.exercise_names[self.exercise[p]],
+                     "sets": float(self.sets[p]), "weight": float(self.weight[p]), "reps": float(self.reps[p])} for p in pos]
+
+# 채팅 도구용 짧은 텍스트: 종목 추이 (없으면 최근 주간 부위별 볼륨)
+def describe(store, exercise="", days=56):
+    since = datetime.date.today() - datetime.timedelta(days=days)
+    name = store.match_exercise(exercise) if exercise else None
+    if name:
+        history = store.exercise_history(name, since)
+        if not history: return f"{name}: 최근 {days}일 기록 없음"
+        lines = [f"{name} 최근 {days}일 ({len(history)}회): 날짜 세트 최고중량 추정1RM 볼륨"]
+        lines += [f"{h['date'][5:]} {h['sets']}세트 {h['top_weight'] or '-'}kg 1RM {h['best_e1rm'] or '-'} 볼륨 {h['volume']}" for h in history[-12:]]
+        best = [h["best_e1rm"] for h in history if h["best_e1rm"]]
+        if len(best) > 1: lines.append(f"추정 1RM 변화: {best[0]} -> {best[-1]} ({best[-1] - best[0]:+.1f}kg)")
+        return "\n".join(lines)
+    weeks = store.weekly_volume(weeks=max(1, min(12, days // 7)))
+    prefix = f"'{exercise}' 종목 기록을 찾지 못했습니다. " if exercise else ""
+    return prefix + "주간 부위별 볼륨(kg):\n" + "\n".join(f"{start[5:]}~ " + (", ".join(f"{k} {v}" for k, v in vols.items()) or "기록 없음") for start, vols in weeks)
@@ -0,0 +1,158 @@
+import argparse
+import datetime
+import json
+import platform
+import random
+import sys
+import time
+from contextlib import contextmanager
+import google.generativeai as genai
+import database
+import diet
+import fakes
+import llm
+import metrics
+import report
+import workout
+
+# ==========================================
+# 오프라인 벤치마크: 가짜 시트/Gemini 로 주요 경로를 행 수별로 실행 -> 시간/API 호출 수/LLM 호출 수를 JSON 으로 저장
+# 사용 예) python benchmark.py --sizes 100 1000 --out bench.json --baseline bench_prev.json
+# ==========================================
+
+DIET_HEADER = ["날짜", "아침", "점심", "간식", "저녁", "보충제", "총합", "점수", "코멘트"]
+WORKOUT_HEADER = ["날짜", "종목", "세트", "무게", "횟수", "1RM", "볼륨", "비고"]
+EXERCISES = {
+    "등": ["데드리프트", "렛풀다운"], "가슴": ["벤치프레스", "팩덱플라이"], "하체": ["스쿼트", "레그익스텐션"],
+    "어깨": ["OHP", "사레레"], "이두": ["바벨컬"], "삼두": ["케이블푸시다운"], "복근": ["크런치"],
+    "유산소": ["러닝"], "기타": ["스트레칭"],
+}
+MENUS = ["잡곡밥(1공기)", "닭가슴살(200g)", "라면(2/3개, 국물 버림)", "계란(3개)", "샐러드(1접시)", "프로틴(1스쿱)", ""]
+
+# 어제부터 거꾸로 n일치 (오늘 행은 채점 대상이 아니므로 제외)
+def synthetic_sheets(n, seed=0):
+    rnd = random.Random(seed)
+    today = datetime.date.today()
+    dates = [(today - datetime.timedelta(days=n - i)).isoformat() for i in range(n)]
+    sheets = {"식단": [DIET_HEADER] + [[d] + [rnd.choice(MENUS) for _ in range(5)] + ["", "", ""] for d in dates]}
+    for sheet, names in EXERCISES.items():
+        sheets[sheet] = [WORKOUT_HEADER] + [
+            [d, rnd.choice(names), str(rnd.randint(3, 5)), str(rnd.randrange(20, 140, 5)), str(rnd.randint(3, 15)), "", "", ""]
+            for d in dates
+        ]
+    sheets["기억_DB"] = [["날짜", "내용"]]
+    return sheets
+
+class FakeSMTP:
+    def __init__(self, *args, **kwargs): pass
+    def starttls(self): pass
+    def login(self, *args): pass
+    def sendmail(self, *args): pass
+    def quit(self): pass
+
+# 실제 Gemini/SMTP 대신 가짜를 끼우고, 응답 캐시는 끔 (매번 같은 양의 LLM 호출이 일어나도록)
+@contextmanager
+def offline():
+    saved = (genai.GenerativeModel, report.smtplib.SMTP, llm.CACHE_ENABLED, metrics.registry.throttles.get("sheets"))
+    genai.GenerativeModel, report.smtplib.SMTP, llm.CACHE_ENABLED = fakes.FakeModel, FakeSMTP, False
+    try: yield
+    finally:
+        genai.GenerativeModel, report.smtplib.SMTP, llm.CACHE_ENABLED, throttle = saved
+        if throttle: metrics.registry.throttles["sheets"] = throttle
+
+def _log_diet(db, ops):
+    return [diet.log_diet(db, MENUS[i % 6], "1인분", ["아침", "점심", "저녁", "간식"][i % 4]) for i in range(ops)]
+
+def _log_workout(db, ops):
+    names = list(EXERCISES)
+    return [workout.log_workout(db, names[i % len(names)], "벤치프레스", "5", "80", "5") for i in range(ops)]
+
+# 경로 이름 -> (db, ops) 를 받아 결과를 돌려주는 함수
+PATHS = {
+    "log_diet": _log_diet,
+    "log_workout": _log_workout,
+    "batch_score": lambda db, ops: diet.batch_score(db, rpm=10**6, use_cache=False, full_rescan=True),
+    "batch_score_llm": lambda db, ops: diet.batch_score(db, rpm=10**6, use_cache=False, full_rescan=True, local_first=False),
+    "batch_calculate": lambda db, ops: workout.batch_calculate(db, full_rescan=True),
+    "send_weekly_report": lambda db, ops: report.send_weekly_report(db, "bench@example.com", "pw"),
+}
+
+# 시트 스로틀은 가짜 쿼터(quota_per_min)가 있을 때만 같은 한도로 켬 (없으면 호출 수만 측정)
+def run_one(path, rows, ops=50, latency=0.0, llm_latency=0.0, quota_per_min=None, error_rate=0.0, seed=0):
+    client = fakes.FakeClient(synthetic_sheets(rows, seed), latency=latency, quota_per_min=quota_per_min, error_rate=error_rate, seed=seed)
+    metrics.set_throttle("sheets", quota_per_min)
+    db = database.DBHandler(client=client)
+    client.api.reset() # 연결 과정 호출은 제외
+    metrics.registry.reset()
+    fakes.FakeModel.reset(latency=llm_latency)
+    t = time.perf_counter()
+    result = PATHS[path](db, ops)
+    wall = time.perf_counter() - t
+    if isinstance(result, list):
+        result = f"{sum(1 for r in result if r == 'success')}/{len(result)} success"
+    return {
+        "path": path, "rows": rows, "wall_s": round(wall, 4),
+        "sheets_calls": dict(client.api.calls), "sheets_calls_total": sum(client.api.calls.values()),
+        "sheets_errors": dict(client.api.errors),
+        "llm_calls": sum(fakes.FakeModel.stats.values()),
+        "throttle_wait_s": round(metrics.registry.throttles["sheets"].waited, 3) if quota_per_min else 0.0,
+        "result": str(result)[:200],
+    }
+
+# 기준 결과 대비 API/LLM 호출 수가 늘었거나 시간이 tolerance 배를 넘으면 회귀로 보고
+def compare(results, baseline, tolerance=1.5):
+    base = {(r["path"], r["rows"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        b = base.get((r["path"], r["rows"]))
+        if not b: continue
+        for key in ("sheets_calls_total", "llm_calls"):
+            if r[key] > b[key]: regressions.append(f"{r['path']}@{r['rows']}: {key} {b[key]} -> {r[key]}")
+        if r["wall_s"] > b["wall_s"] * tolerance and r["wall_s"] - b["wall_s"] > 0.05:
+            regressions.append(f"{r['path']}@{r['rows']}: wall_s {b['wall_s']} -> {r['wall_s']}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Project Jarvis 오프라인 벤치마크")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--paths", nargs="+", default=list(PATHS), choices=list(PATHS))
+    parser.add_argument("--ops", type=int, default=50, help="log_* 경로의 기록 횟수")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="시트 API 호출당 지연")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="LLM 호출당 지연")
+    parser.add_argument("--quota", type=int, default=None, help="분당 시트 API 호출 한도 (초과 시 429)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="시트 API 무작위 503 비율")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON (회귀 시 종료 코드 1)")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    results = []
+    with offline():
+        for rows in args.sizes:
+            for path in args.paths:
+                r = run_one(path, rows, args.ops, args.latency_ms / 1000, args.llm_latency_ms / 1000, args.quota, args.error_rate, args.seed)
+                results.append(r)
+                print(f"{path:>20} {rows:>6}행  {r['wall_s']:>8.3f}s  시트 {r['sheets_calls_total']:>5}회  LLM {r['llm_calls']:>5}회")
+
+    out = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "latency_ms": args.latency_ms, "llm_latency_ms": args.llm_latency_ms, "quota": args.quota,
+            "error_rate": args.error_rate, "ops": args.ops, "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(out, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions: print(f"회귀: {line}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
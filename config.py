@@ -9,6 +9,13 @@ SYSTEM_PROMPT = """
 3. **데이터 처리**: 사용자가 개떡같이 말해도 찰떡같이 알아듣고 데이터로 변환하십시오. (예: "아까 그거" -> 문맥 파악 후 기록)
 """
 
+# 사진 업로드 전처리 (긴 변 최대 픽셀, JPEG 품질)
+IMAGE_MAX_SIDE = 1024
+IMAGE_JPEG_QUALITY = 85
+
+# 채팅 응답을 스트리밍으로 받아 조각 단위로 표시 (사이드바에서 끌 수 있음)
+STREAM_RESPONSES = True
+
 # 사용자 운동 루틴 (수정 가능)
 USER_ROUTINE = """
 - 월: 휴식
@@ -20,6 +27,9 @@ USER_ROUTINE = """
 - 일: 팔, 복근, 유산소
 """
 
-def get_system_prompt(memory_txt):
+# memory_index: 기억 검색 인덱스, message: 현재 사용자 메시지 (관련 기억만 토큰 예산 안에서 선택)
+def get_system_prompt(memory_index, message="", k=8, token_budget=400):
+    facts = memory_index.top_facts(message, k=k, token_budget=token_budget)
+    memory_txt = "\n".join(f"- {f}" for f in facts) if facts else "기억 없음"
     today = datetime.datetime.now().strftime("%Y-%m-%d %A")
     return f"{SYSTEM_PROMPT}\n[기억 정보]: {memory_txt}\n[현재 시간]: {today}\n[루틴]: {USER_ROUTINE}"
\ No newline at end of file
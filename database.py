@@ -2,45 +2,381 @@ import streamlit as st
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import datetime
+import functools
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+import storage
+import memory
+import metrics
+
+Cell = namedtuple("Cell", ["row", "col", "value"])
+
+# 시트 스냅샷 캐시: 시트별 전체 값을 보관 (TTL 만료 + 개수 초과 시 오래된 시트부터 제거)
+class SheetCache:
+    def __init__(self, ttl=300, max_sheets=16):
+        self.ttl = ttl
+        self.max_sheets = max_sheets
+        self._data = OrderedDict()  # 시트 이름 -> (적재 시각, rows)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def get(self, sheet_name):
+        with self.lock:
+            item = self._data.get(sheet_name)
+            if item and time.monotonic() - item[0] < self.ttl:
+                self._data.move_to_end(sheet_name)
+                self.hits += 1
+                return item[1]
+            if item: del self._data[sheet_name]
+            self.misses += 1
+            return None
+
+    def put(self, sheet_name, rows):
+        with self.lock:
+            self._data[sheet_name] = (time.monotonic(), rows)
+            self._data.move_to_end(sheet_name)
+            while len(self._data) > self.max_sheets:
+                self._data.popitem(last=False)
+
+    # 쓰기 반영 (캐시에 없는 시트는 무시 - 다음 읽기 때 새로 받음)
+    def patch_cell(self, sheet_name, row, col, val):
+        with self.lock:
+            item = self._data.get(sheet_name)
+            if not item: return
+            rows = item[1]
+            while len(rows) < row: rows.append([])
+            while len(rows[row-1]) < col: rows[row-1].append("")
+            rows[row-1][col-1] = "" if val is None else str(val)
+
+    def patch_append(self, sheet_name, data):
+        with self.lock:
+            item = self._data.get(sheet_name)
+            if item: item[1].append(["" if v is None else str(v) for v in data])
+
+    # 통계/LRU 순서에 영향 없이 유효한 스냅샷만 조회 (없으면 None)
+    def peek(self, sheet_name):
+        with self.lock:
+            item = self._data.get(sheet_name)
+            return item[1] if item and time.monotonic() - item[0] < self.ttl else None
+
+    def invalidate(self, sheet_name=None):
+        with self.lock:
+            if sheet_name is None: self._data.clear()
+            else: self._data.pop(sheet_name, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0, "sheets": len(self._data)}
+
+
+# 키 열(예: 날짜) 값 -> 행 번호 인덱스 + 최근 행 내용 캐시 (핸들러 쓰기로 갱신, 어긋나면 다시 빌드)
+class RowIndex:
+    def __init__(self, rows, key_col=1, recent=14):
+        self.key_col = key_col
+        self.recent_size = recent
+        self.built_at = time.monotonic()
+        self.n_rows = len(rows)
+        self.rows = {}
+        for i, row in enumerate(rows, start=1):
+            if len(row) >= key_col and row[key_col-1]: self.rows[row[key_col-1]] = i
+        self.recent = OrderedDict((i, list(rows[i-1])) for i in range(max(1, len(rows) - recent + 1), len(rows) + 1))
+
+    def remember(self, row, values):
+        self.recent[row] = values
+        self.recent.move_to_end(row)
+        while len(self.recent) > self.recent_size: self.recent.popitem(last=False)
+
+    def lookup(self, key):
+        row = self.rows.get(key)
+        if row is None: return None
+        return row, self.recent.get(row)
+
+    def on_append(self, data):
+        self.n_rows += 1
+        values = ["" if v is None else str(v) for v in data]
+        if len(values) >= self.key_col and values[self.key_col-1]: self.rows[values[self.key_col-1]] = self.n_rows
+        self.remember(self.n_rows, values)
+
+    def on_update(self, row, col, val):
+        values = self.recent.get(row)
+        if values is not None:
+            while len(values) < col: values.append("")
+            values[col-1] = "" if val is None else str(val)
+        if col == self.key_col:
+            self.rows = {k: r for k, r in self.rows.items() if r != row}
+            if val: self.rows[str(val)] = row
+
+# 첫 인자(sheet_name) 기준 시트별 잠금 - 도구 병렬 실행 시 같은 시트의 읽기-수정-쓰기가 섞이지 않도록
+def _sheet_locked(method):
+    @functools.wraps(method)
+    def wrapper(self, sheet_name, *args, **kwargs):
+        with self._lock(sheet_name):
+            return method(self, sheet_name, *args, **kwargs)
+    return wrapper
 
 class DBHandler:
-    def __init__(self):
+    # client: 테스트/벤치마크용 가짜 gspread 클라이언트를 주입할 수 있음 (없으면 실제 인증)
+    # local_path: 지정하면 로컬 SQLite가 주 저장소가 되고, 시트에는 백그라운드 Syncer가 복제
+    # state_path: 워터마크 등 작업 상태 저장 위치 (없으면 local_path, 둘 다 없으면 메모리)
+    def __init__(self, client=None, local_path=None, sync=True, state_path=None, max_buffer=100, cache_ttl=300):
+        self.cache = SheetCache(ttl=cache_ttl)
+        self._cell_buf = {}     # 시트 이름 -> {(row, col): val}
+        self._row_buf = {}      # 시트 이름 -> [row, ...]
+        self._range_buf = {}    # 시트 이름 -> [(시작 row, 시작 col, 2차원 values), ...]
+        self._local = threading.local() # 버퍼 모드는 스레드별 (백그라운드 작업의 batch() 가 채팅 기록을 붙잡지 않도록)
+        self.max_buffer = max_buffer
+        self._indexes = {}      # 시트 이름 -> RowIndex
+        self._memory_index = None
+        self._workout_store = None
+        self._locks = {}        # 시트 이름 -> RLock
+        self._locks_guard = threading.Lock()
+        self.index_ttl = 600    # 인덱스 강제 재빌드 주기(초) - 외부 수정으로 인한 어긋남 대비
+        self.doc = None
+        self.remote = None
+        self.syncer = None
         try:
-            scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(st.secrets["gcp_service_account"]), scope)
-            client = gspread.authorize(creds)
-            self.doc = client.open("운동일지_DB") # 시트 이름 확인 필수
+            if client is None:
+                scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+                creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(st.secrets["gcp_service_account"]), scope)
+                client = gspread.authorize(creds)
+            self.doc = metrics.call("sheets", "open", client.open, "운동일지_DB") # 시트 이름 확인 필수
+            self.remote = storage.SheetsBackend(self.doc)
         except Exception as e:
             st.error(f"DB 연결 실패: {e}")
+        # 시트 연결에 실패해도 로컬 저장소가 있으면 기록은 계속 가능 (연결 복구 후 outbox부터 이어서 동기화)
+        if local_path:
+            self.backend, self.syncer = storage.open_local(local_path, self.remote, sync=sync)
+            self.backend.on_stale = self.invalidate
+        else:
+            self.backend = self.remote
+        self.state = storage.StateStore(state_path or local_path or ":memory:")
+
+    @property
+    def _buffering(self):
+        return getattr(self._local, "depth", 0)
+
+    @_buffering.setter
+    def _buffering(self, depth):
+        self._local.depth = depth
+
+    def _lock(self, sheet_name):
+        with self._locks_guard:
+            return self._locks.setdefault(sheet_name, threading.RLock())
+
+    def get_state(self, key, default=None):
+        return self.state.get(key, default)
+
+    def set_state(self, key, value):
+        self.state.set(key, value)
 
+    # 스냅샷 캐시/행 인덱스 폐기 (동기화 충돌 등으로 저장소 내용이 바뀐 경우). sheet_name=None 이면 전체
+    def invalidate(self, sheet_name=None):
+        for name in [sheet_name] if sheet_name else list(self._indexes):
+            with self._lock(name):
+                self.cache.invalidate(name)
+                self._indexes.pop(name, None)
+        if sheet_name is None: self.cache.invalidate()
+        with self._lock("운동_저장소"): # 운동 시트가 원격 기준으로 바뀌면 열 저장소도 다음 조회 때 다시 적재
+            store = self._workout_store
+            if store is not None and (sheet_name is None or sheet_name in store.loaded_sheets): self._workout_store = None
+
+    def sync_status(self):
+        return self.syncer.status() if self.syncer else None
+
+    # ==========================================
+    # 버퍼 쓰기 모드: with db.batch(): 블록 안의 쓰기는 모아서 시트별 1회 호출로 반영
+    # ==========================================
+    @contextmanager
+    def batch(self):
+        self._buffering += 1
+        try:
+            yield self
+        finally:
+            self._buffering -= 1
+            if not self._buffering: self.flush()
+
+    def _has_pending(self, sheet_name):
+        return sheet_name in self._cell_buf or sheet_name in self._row_buf or sheet_name in self._range_buf
+
+    def pending_count(self):
+        return sum(len(v) for v in self._cell_buf.values()) + sum(len(v) for v in self._row_buf.values()) \
+            + sum(len(v) for v in self._range_buf.values())
+
+    def flush(self, sheet_name=None):
+        names = [sheet_name] if sheet_name else list(set(self._cell_buf) | set(self._row_buf) | set(self._range_buf))
+        for name in names:
+            with self._lock(name):
+                cells = self._cell_buf.pop(name, None)
+                rows = self._row_buf.pop(name, None)
+                ranges = self._range_buf.pop(name, None)
+                try:
+                    self.backend.apply(name, cells=cells, ranges=ranges, rows=rows)
+                except:
+                    self.cache.invalidate(name) # 반영 실패 시 캐시가 실제 시트와 어긋나므로 폐기
+                    self._indexes.pop(name, None)
+                    raise
+
+    # 시트별 대기 쓰기가 max_buffer 에 도달하면 그 시트만 반영 (다른 시트 잠금을 잡지 않음)
+    def _check_buffer(self, sheet_name):
+        pending = len(self._cell_buf.get(sheet_name, ())) + len(self._row_buf.get(sheet_name, ())) + len(self._range_buf.get(sheet_name, ()))
+        if pending >= self.max_buffer: self.flush(sheet_name)
+
+    @_sheet_locked
     def append_row(self, sheet_name, data):
         try:
-            self.doc.worksheet(sheet_name).append_row(data)
+            if self._buffering:
+                self._row_buf.setdefault(sheet_name, []).append(list(data))
+                self._check_buffer(sheet_name)
+            else:
+                self.backend.apply(sheet_name, rows=[list(data)])
+            self.cache.patch_append(sheet_name, data)
+            if sheet_name in self._indexes: self._indexes[sheet_name].on_append(data)
             return "success"
-        except: return "fail"
+        except:
+            self.cache.invalidate(sheet_name)
+            self._indexes.pop(sheet_name, None)
+            return "fail"
 
+    @_sheet_locked
     def update_cell(self, sheet_name, row, col, val):
-        self.doc.worksheet(sheet_name).update_cell(row, col, val)
+        try:
+            if self._buffering:
+                self._cell_buf.setdefault(sheet_name, {})[(row, col)] = val
+                self._check_buffer(sheet_name)
+            else:
+                self.backend.apply(sheet_name, cells={(row, col): val})
+            self.cache.patch_cell(sheet_name, row, col, val)
+            if sheet_name in self._indexes: self._indexes[sheet_name].on_update(row, col, val)
+        except:
+            self.cache.invalidate(sheet_name)
+            self._indexes.pop(sheet_name, None)
+            raise
+
+    # (row, col)을 왼쪽 위로 하는 2차원 범위 쓰기
+    @_sheet_locked
+    def update_range(self, sheet_name, row, col, values):
+        if not values: return
+        try:
+            if self._buffering:
+                # 범위에 덮이는 대기 중 셀 쓰기는 버림 (나중 쓰기가 우선)
+                pending = self._cell_buf.get(sheet_name, {})
+                for key in [k for k in pending if row <= k[0] < row + len(values) and col <= k[1] < col + len(values[k[0] - row])]:
+                    del pending[key]
+                self._range_buf.setdefault(sheet_name, []).append((row, col, values))
+                self._check_buffer(sheet_name)
+            else:
+                self.backend.apply(sheet_name, ranges=[(row, col, values)])
+            idx = self._indexes.get(sheet_name)
+            for i, vals in enumerate(values):
+                for j, v in enumerate(vals):
+                    self.cache.patch_cell(sheet_name, row + i, col + j, v)
+                    if idx: idx.on_update(row + i, col + j, v)
+        except:
+            self.cache.invalidate(sheet_name)
+            self._indexes.pop(sheet_name, None)
+            raise
 
+    # 스냅샷 캐시 우선 조회 (호출자가 행을 수정해도 캐시가 오염되지 않도록 복사본 반환)
+    @_sheet_locked
     def get_all_values(self, sheet_name):
-        return self.doc.worksheet(sheet_name).get_all_values()
+        rows = self.cache.get(sheet_name)
+        if rows is None:
+            if self._has_pending(sheet_name): self.flush(sheet_name)
+            rows = self.backend.get_all_values(sheet_name)
+            self.cache.put(sheet_name, rows)
+        return [list(r) for r in rows]
+
+    # (헤더 행, start_row부터 끝까지의 행 복사본) - 스냅샷이 있으면 잘라서, 없으면 꼬리 구간만 읽기
+    @_sheet_locked
+    def get_rows(self, sheet_name, start_row):
+        rows = self.cache.get(sheet_name)
+        if rows is None:
+            if self._has_pending(sheet_name): self.flush(sheet_name)
+            header, tail = self.backend.get_rows(sheet_name, start_row)
+            return list(header), [list(r) for r in tail]
+        return (list(rows[0]) if rows else []), [list(r) for r in rows[start_row-1:]]
+
+    # 키 열 값으로 행 찾기 -> (행 번호, 행 내용) 또는 None. 인덱스가 살아 있으면 시트 읽기 없이 처리
+    @_sheet_locked
+    def find_row(self, sheet_name, key, key_col=1):
+        idx = self._indexes.get(sheet_name)
+        if idx is None or idx.key_col != key_col or time.monotonic() - idx.built_at > self.index_ttl:
+            idx = self._rebuild_index(sheet_name, key_col)
+        found = idx.lookup(key)
+        # 유효한 스냅샷이 있으면 (네트워크 없이) 인덱스 어긋남 검사
+        snapshot = self.cache.peek(sheet_name)
+        if snapshot is not None:
+            stale = len(snapshot) != idx.n_rows
+            if found: stale = stale or found[0] > len(snapshot) or snapshot[found[0]-1][key_col-1:key_col] != [key]
+            if stale:
+                idx = self._rebuild_index(sheet_name, key_col)
+                found = idx.lookup(key)
+        if not found: return None
+        row, values = found
+        if values is None:
+            values = self.get_all_values(sheet_name)[row-1]
+            idx.remember(row, list(values))
+        return row, list(values)
+
+    def _rebuild_index(self, sheet_name, key_col):
+        idx = self._indexes[sheet_name] = RowIndex(self.get_all_values(sheet_name), key_col)
+        return idx
 
     def find_cell(self, sheet_name, query):
-        try: return self.doc.worksheet(sheet_name).find(query)
-        except: return None
-        
+        try:
+            for i, row in enumerate(self.get_all_values(sheet_name), start=1):
+                if query in row: return Cell(i, row.index(query) + 1, query)
+        except: pass
+        return None
+
+    @_sheet_locked
     def get_cell_value(self, sheet_name, row, col):
-        return self.doc.worksheet(sheet_name).cell(row, col).value
+        pending = self._cell_buf.get(sheet_name, {})
+        if (row, col) in pending: return pending[(row, col)]
+        rows = self.get_all_values(sheet_name)
+        return rows[row-1][col-1] if row <= len(rows) and col <= len(rows[row-1]) else None
 
     # 기억 저장용 (시트 없으면 생성)
     def save_memory(self, fact):
         try:
-            try: ws = self.doc.worksheet("기억_DB")
-            except: ws = self.doc.add_worksheet("기억_DB", 100, 2); ws.append_row(["날짜", "내용"])
-            ws.append_row([datetime.datetime.now().strftime("%Y-%m-%d"), fact])
-            return "success"
+            with self._lock("기억_DB"): # 인덱스 최초 빌드와 겹쳐 같은 기억이 두 번 들어가지 않도록
+                self.backend.ensure_sheet("기억_DB", ["날짜", "내용"])
+                if self.append_row("기억_DB", [datetime.datetime.now().strftime("%Y-%m-%d"), fact]) == "success":
+                    if self._memory_index is not None: self._memory_index.add(fact)
+                    return "success"
+            return "Error: 기록 실패"
         except Exception as e: return f"Error: {e}"
 
+    # 기억 검색 인덱스 (최초 1회만 기억_DB 전체를 읽고, 이후는 save_memory 로 증분 갱신)
+    def memory_index(self):
+        with self._lock("기억_DB"):
+            if self._memory_index is None:
+                index = memory.MemoryIndex()
+                try:
+                    for r in self.get_all_values("기억_DB")[1:]:
+                        if len(r) > 1 and r[1]: index.add(r[1])
+                except: pass
+                self._memory_index = index
+            return self._memory_index
+
+    # 운동 기록 열 저장소 (최초 1회만 부위 시트들을 읽고, 이후는 append_workout 으로 증분 갱신)
+    def workout_store(self):
+        if self._workout_store is None:
+            import analytics # numpy 는 운동 조회가 필요할 때만 불러옴
+            with self._lock("운동_저장소"):
+                if self._workout_store is None: self._workout_store = analytics.WorkoutStore.load(self)
+        return self._workout_store
+
+    # 운동 기록 추가 + 열 저장소 반영 (저장소 최초 로드와 같은 잠금 - 로드 중 기록이 중복/누락되지 않도록)
+    def append_workout(self, sheet_name, data):
+        with self._lock("운동_저장소"):
+            res = self.append_row(sheet_name, data)
+            if res == "success" and self._workout_store is not None: self._workout_store.add_rows(sheet_name, [list(data)])
+        return res
+
     def load_memory(self):
-        try: return "\n".join([f"- {r[1]}" for r in self.doc.worksheet("기억_DB").get_all_values()[1:][-15:]])
-        except: return "기억 없음"
\ No newline at end of file
+        try: return "\n".join([f"- {r[1]}" for r in self.get_all_values("기억_DB")[1:][-15:]])
+        except: return "기억 없음"
@@ -1,19 +1,16 @@
 import datetime
-import time
 import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import google.generativeai as genai
 import streamlit as st
+import llm
+import nutrition
 
 # ==========================================
 # 1. 식단 기록 함수 (기존 유지)
 # ==========================================
 def log_diet(db, menu, amount, meal_type):
     try:
-        try:
-            ws = db.doc.worksheet("식단")
-        except:
-            return "오류: '식단' 시트가 없습니다."
-
         today = datetime.datetime.now().strftime("%Y-%m-%d")
         
         col_map = {
@@ -23,22 +20,22 @@ def log_diet(db, menu, amount, meal_type):
         target_col = col_map.get(meal_type, 4) 
         input_text = f"{menu}({amount})"
 
+        # 날짜 -> 행 인덱스 조회 (최근 행 내용도 캐시되어 있어 기록은 쓰기 1회로 끝남)
         try:
-            cell = ws.find(today)
+            found = db.find_row("식단", today)
         except:
-            cell = None
+            return "오류: '식단' 시트가 없습니다."
 
-        if cell:
-            row_idx = cell.row
-            curr_val = ws.cell(row_idx, target_col).value
+        if found:
+            row_idx, values = found
+            curr_val = values[target_col-1] if len(values) >= target_col else ""
             new_val = f"{curr_val}, {input_text}" if curr_val else input_text
-            ws.update_cell(row_idx, target_col, new_val)
+            db.update_cell("식단", row_idx, target_col, new_val) # 핸들러 경유 (스냅샷 캐시/인덱스 동기화)
             return "success"
         else:
             new_row = [today, "", "", "", "", "", "", "", ""] 
             new_row[target_col-1] = input_text
-            ws.append_row(new_row)
-            return "success"
+            return db.append_row("식단", new_row)
 
     except Exception as e:
         return f"에러 발생: {str(e)}"
@@ -46,145 +43,267 @@ def log_diet(db, menu, amount, meal_type):
 # ==========================================
 # 2. 식단 채점 함수 (수정됨: 간헐적 단식, 당일 제외, 말투 교정)
 # ==========================================
-def batch_score(db):
+SCORING_INTRO = """
+    당신은 사용자의 전담 영양사입니다. 
+    아래 제공된 식단 데이터를 기반으로 영양 성분을 분석하여 JSON으로 반환하십시오.
+    단순히 음식 이름만 보는 것이 아니라, '섭취량'과 '섭취 방식'을 고려하여 합리적으로 점수를 산출하십시오.
+
+    [사용자 프로필]
+    - 키/체중: 183cm / 82kg
+    - 골격근 : 40kg
+    - 목표: 빠른 체지방 커팅 (근손실 최소화)
+    - **특이사항: 간헐적 단식 진행 중 (아침 식사 건너뛰는 것은 계획된 행동임. 절대 감점 사유 아님)**
+"""
+
+SCORING_RULES = """
+    [지시사항]
+    1. **계산**: 오직 '입력된 텍스트'에 기반하여 칼로리와 탄단지를 보수적으로 추산하십시오. (추측하여 부풀리지 말 것)
+       - 잡곡밥 1공기는 약 300kcal (탄수화물 약 65g) 수준입니다. 200g 탄수화물 같은 터무니없는 수치 금지.
+       - 사용자의 기초대사량과 운동량을 감안하여 채점하십시오.
+    2. **평가**: 아침을 안 먹은 것에 대해 지적하지 마십시오. 단백질 섭취량이 체중 대비(약 160g 이상) 충분한지 집중 확인하십시오.
+    3. **말투**: "어디로 증발하셨습니까?" 같은 비꼬는 말투 절대 금지. **매우 정중하고 분석적인 비서의 어조(존댓말)**를 사용하십시오.
+
+    [채점 로직 (기본 100점)]
+
+    1. **단백질 평가 (가장 중요)**
+       - 일일 추정 단백질 140g 미만: **-15점**
+       - (단, 120g 이상 140g 미만이면 노력 참작하여 **-7점**)
+
+    2. **위반 사항 감점 (항목별 기본 -10점)**
+       - A. 정제 탄수화물 (라면, 빵, 당류)
+       - B. 나쁜 지방 (튀김, 과도한 소스, 지방 많은 부위)
+       - C. 과식 (하루 섭취량 2100kcal 초과)
+
+    3. **★ 감면 규정 (Mitigation Factors) ★**
+       - 위 2번 위반 사항이 있더라도, 아래 경우엔 **감점을 50%로 줄이시오.** (-10점 -> -5점)
+         a) **양 조절**: 1인분이 아닌 '반 개', '2/3 공기', '한 조각' 등 소량 섭취 시.
+         b) **섭취 방식 개선**: '국물 버림', '소스 따로', '껍질 제거' 등 구체적 노력이 적힌 경우.
+         c) **대체**: '제로 음료', '프로틴 빵' 등 대체 식품 활용 시 감점 없음(0점).
+
+    4. **가산점 (+5점)**
+       - 가공식품 없이 자연식(클린 푸드)으로만 구성된 날.
+
+    [시뮬레이션 예시]
+    - "라면 1개 + 밥 말아서" -> 국물 섭취 및 탄수화물 과다 -> **-15점 (가중 처벌)**
+    - "라면 2/3개 (국물 버림)" -> 정제 탄수화물이지만 노력 인정(감면) -> **-5점**
+"""
+
+# with_date=False: 날짜가 빠진 프롬프트라 같은 식단이면 날짜가 달라도 응답 캐시가 적중함
+def _day_block(row, with_date=True):
+    date_line = f"\n    - 날짜: {row[0]}" if with_date else ""
+    return f"""{date_line}
+    - 아침: {row[1]} (공란일 경우 단식 중임)
+    - 점심: {row[2]}
+    - 간식: {row[3]}
+    - 저녁: {row[4]}
+    - 보충제: {row[5]}
+"""
+
+def build_prompt(row):
+    return f"""{SCORING_INTRO}
+    [분석할 식단 데이터]{_day_block(row, with_date=False)}{SCORING_RULES}
+    [필수 응답 포맷 - JSON Only]
+    반드시 아래 JSON 형식으로만 출력하십시오.
+    {{
+        "total": "약 1800kcal (탄:150g, 단:160g, 지:50g)",
+        "score": "85",
+        "comment": "점심의 탄수화물 비중이 적절하며, 저녁 단백질 보충도 훌륭합니다."
+    }}
+    """
+
+# 여러 날을 한 요청으로 묶는 프롬프트 (고정 지시문 토큰을 N일이 나눠 씀)
+def build_batch_prompt(rows):
+    days = "".join(_day_block(row) for row in rows)
+    return f"""{SCORING_INTRO}
+    [분석할 식단 데이터 - 총 {len(rows)}일, 각 날짜를 독립적으로 채점]{days}{SCORING_RULES}
+    [필수 응답 포맷 - JSON 배열 Only]
+    반드시 날짜마다 하나씩, 아래 JSON 배열 형식으로만 출력하십시오. "date"는 입력 날짜와 정확히 같아야 합니다.
+    [
+        {{
+            "date": "2024-01-01",
+            "total": "약 1800kcal (탄:150g, 단:160g, 지:50g)",
+            "score": "85",
+            "comment": "점심의 탄수화물 비중이 적절하며, 저녁 단백질 보충도 훌륭합니다."
+        }}
+    ]
+    """
+
+# 로컬 추정 결과(총량/점수/감점 내역)를 주고 코멘트 한두 문장만 요청
+def build_comment_prompt(row, est):
+    deductions = "; ".join(f"{d}({p:+d}점)" for d, p in est.deductions) or "없음"
+    return f"""
+    당신은 사용자의 전담 영양사입니다. 아래 식단과 계산된 채점 결과를 보고 코멘트 1~2문장만 작성하십시오.
+    매우 정중하고 분석적인 비서의 어조(존댓말), 아침 공란(간헐적 단식)은 지적하지 말 것. 코멘트 외의 문장은 출력하지 마십시오.
+    {_day_block(row, with_date=False)}
+    - 추정 총량: {est.total_text()}
+    - 점수: {est.score}점 (내역: {deductions})
+    """
+
+def parse_json(raw_text):
+    clean_text = raw_text.strip().replace("```json", "").replace("```", "").strip()
+    return json.loads(clean_text)
+
+# call: 프롬프트 -> 응답 텍스트 (속도 제한/재시도/캐시가 적용된 llm.generate)
+def _score_row(call, row):
+    data = parse_json(call(build_prompt(row)))
+    return data.get("total", "계산 불가"), data.get("score", "0"), data.get("comment", "분석 실패")
+
+# 날짜 -> (total, score, comment). 응답에서 빠졌거나 형식이 깨진 날짜는 결과에 포함하지 않음
+def _score_chunk(call, rows):
+    if len(rows) == 1:
+        return {rows[0][0]: _score_row(call, rows[0])}
+    try:
+        data = parse_json(call(build_batch_prompt(rows)))
+    except ValueError:
+        return {} # JSON 파싱 실패 -> 전부 개별 재요청
+    dates = {row[0] for row in rows}
+    out = {}
+    for item in data if isinstance(data, list) else []:
+        if isinstance(item, dict) and item.get("date") in dates and str(item.get("score", "")).strip():
+            out[item["date"]] = (item.get("total", "계산 불가"), str(item["score"]), item.get("comment", "분석 실패"))
+    return out
+
+# batch_size일씩 묶되, 식단 텍스트 추정 토큰이 max_prompt_tokens를 넘으면 묶음을 끊음 (같은 날짜는 한 묶음에 중복 금지)
+def _chunk_targets(targets, batch_size, max_prompt_tokens):
+    chunks, cur, cur_tokens = [], [], 0
+    for target in targets:
+        tokens = llm.estimate_tokens(_day_block(target[1]))
+        dup = any(t[1][0] == target[1][0] for t in cur)
+        if cur and (len(cur) >= batch_size or cur_tokens + tokens > max_prompt_tokens or dup):
+            chunks.append(cur); cur, cur_tokens = [], 0
+        cur.append(target); cur_tokens += tokens
+    if cur: chunks.append(cur)
+    return chunks
+
+# 진행 메시지 출력: 화면 실행이면 Streamlit, 백그라운드 작업이면 job 로그로
+def _notifier(job):
+    if job: return lambda kind, text: job.log(text)
+    return lambda kind, text: getattr(st, kind)(text)
+
+# max_workers개 스레드로 동시 채점, 호출 속도는 토큰 버킷(rpm)으로 제한 (429/5xx는 지수 백오프 재시도)
+# batch_size > 1 이면 여러 날을 한 요청으로 묶어 채점하고, 누락된 날짜만 개별 요청으로 보충
+# use_cache=False 면 응답 캐시를 무시하고 새로 채점
+# local_first=True 면 음식표(nutrition)로 추정 가능한 날은 LLM 없이 채점, llm_comments=True 면 그날 코멘트만 LLM 으로 작성
+# 워터마크(처리 완료된 마지막 행) 이후 + 안전 구간(safety_window행)만 읽음. full_rescan=True 면 처음부터 전부
+# job(jobs.Job)이 주어지면 백그라운드 실행: 진행률/로그는 job 으로, 요청 1건 끝날 때마다 기록+워터마크 저장(체크포인트), 취소 지원
+def batch_score(db, max_workers=4, rpm=30, batch_size=7, max_prompt_tokens=3000, use_cache=True,
+                full_rescan=False, safety_window=7, local_first=True, llm_comments=False, job=None):
+    notify = _notifier(job)
     try:
-        ws = db.doc.worksheet("식단")
-        rows = ws.get_all_values()
+        wm_key = "watermark:식단:score"
+        watermark = 1 if full_rescan else db.get_state(wm_key, 1)
+        start_row = max(2, watermark - safety_window + 1)
+        _, rows = db.get_rows("식단", start_row)
         
         # 모델 설정 (창의성을 낮추고 사실 기반 분석 강화)
         generation_config = {"temperature": 0.1}
         model = genai.GenerativeModel("gemini-2.5-flash", generation_config=generation_config)
-        
-        updated_count = 0
-        target_found = False
+        limiter = llm.RateLimiter(rpm=rpm, burst=max_workers)
+        call = lambda prompt: llm.generate(model, prompt, limiter=limiter, use_cache=use_cache, validate=parse_json)
         
         # 오늘 날짜 확인 (오늘 자 데이터는 채점하지 않음)
         today_str = datetime.datetime.now().strftime("%Y-%m-%d")
 
-        st.write("🕵️ 식단 데이터 분석 시작...")
-        
-        for i, row in enumerate(rows):
-            if i == 0: continue # 헤더 스킵
-
-            current_row_num = i + 1
+        notify("write", "🕵️ 식단 데이터 분석 시작...")
 
+        targets = [] # (행 번호, 행 데이터)
+        first_open = None # 아직 끝나지 않은 첫 행 (오늘 날짜) - 워터마크는 이 앞까지만 전진
+        for row_num, row in enumerate(rows, start=start_row):
             # 데이터 길이 보정
             while len(row) < 9:
                 row.append("")
 
-            date_val = row[0]
-            score_val = row[7]
-            diet_txt = "".join(row[1:6]).strip()
-
             # [수정 1] 오늘 날짜면 채점 스킵 (하루가 안 끝남)
-            if date_val == today_str:
+            if row[0] == today_str:
+                first_open = first_open or row_num
                 continue
 
             # 1. 이미 점수가 있으면 패스
-            if score_val.strip(): 
+            if row[7].strip(): 
                 continue
 
             # 2. 내용이 없으면 패스
-            if not diet_txt:
+            if not "".join(row[1:6]).strip():
                 continue
 
-            target_found = True
-            st.info(f"📍 [Row {current_row_num}] {date_val} 식단 분석 중...")
-
-            # --- 프롬프트 대폭 수정 ---
-            prompt = f"""
-            당신은 사용자의 전담 영양사입니다. 
-            아래 제공된 식단 데이터를 기반으로 영양 성분을 분석하여 JSON으로 반환하십시오.
-            단순히 음식 이름만 보는 것이 아니라, '섭취량'과 '섭취 방식'을 고려하여 합리적으로 점수를 산출하십시오.
-
-            [사용자 프로필]
-            - 키/체중: 183cm / 82kg
-            - 골격근 : 40kg
-            - 목표: 빠른 체지방 커팅 (근손실 최소화)
-            - **특이사항: 간헐적 단식 진행 중 (아침 식사 건너뛰는 것은 계획된 행동임. 절대 감점 사유 아님)**
-
-            [분석할 식단 데이터]
-            - 날짜: {row[0]}
-            - 아침: {row[1]} (공란일 경우 단식 중임)
-            - 점심: {row[2]}
-            - 간식: {row[3]}
-            - 저녁: {row[4]}
-            - 보충제: {row[5]}
-
-            [지시사항]
-            1. **계산**: 오직 '입력된 텍스트'에 기반하여 칼로리와 탄단지를 보수적으로 추산하십시오. (추측하여 부풀리지 말 것)
-               - 잡곡밥 1공기는 약 300kcal (탄수화물 약 65g) 수준입니다. 200g 탄수화물 같은 터무니없는 수치 금지.
-               - 사용자의 기초대사량과 운동량을 감안하여 채점하십시오.
-            2. **평가**: 아침을 안 먹은 것에 대해 지적하지 마십시오. 단백질 섭취량이 체중 대비(약 160g 이상) 충분한지 집중 확인하십시오.
-            3. **말투**: "어디로 증발하셨습니까?" 같은 비꼬는 말투 절대 금지. **매우 정중하고 분석적인 비서의 어조(존댓말)**를 사용하십시오.
-
-            [채점 로직 (기본 100점)]
-            
-            1. **단백질 평가 (가장 중요)**
-               - 일일 추정 단백질 140g 미만: **-15점**
-               - (단, 120g 이상 140g 미만이면 노력 참작하여 **-7점**)
-
-            2. **위반 사항 감점 (항목별 기본 -10점)**
-               - A. 정제 탄수화물 (라면, 빵, 당류)
-               - B. 나쁜 지방 (튀김, 과도한 소스, 지방 많은 부위)
-               - C. 과식 (하루 섭취량 2100kcal 초과)
-
-            3. **★ 감면 규정 (Mitigation Factors) ★**
-               - 위 2번 위반 사항이 있더라도, 아래 경우엔 **감점을 50%로 줄이시오.** (-10점 -> -5점)
-                 a) **양 조절**: 1인분이 아닌 '반 개', '2/3 공기', '한 조각' 등 소량 섭취 시.
-                 b) **섭취 방식 개선**: '국물 버림', '소스 따로', '껍질 제거' 등 구체적 노력이 적힌 경우.
-                 c) **대체**: '제로 음료', '프로틴 빵' 등 대체 식품 활용 시 감점 없음(0점).
-
-            4. **가산점 (+5점)**
-               - 가공식품 없이 자연식(클린 푸드)으로만 구성된 날.
-
-            [시뮬레이션 예시]
-            - "라면 1개 + 밥 말아서" -> 국물 섭취 및 탄수화물 과다 -> **-15점 (가중 처벌)**
-            - "라면 2/3개 (국물 버림)" -> 정제 탄수화물이지만 노력 인정(감면) -> **-5점**
-            
-            [필수 응답 포맷 - JSON Only]
-            반드시 아래 JSON 형식으로만 출력하십시오.
-            {{
-                "total": "약 1800kcal (탄:150g, 단:160g, 지:50g)",
-                "score": "85",
-                "comment": "점심의 탄수화물 비중이 적절하며, 저녁 단백질 보충도 훌륭합니다."
-            }}
-            """
-
-            try:
-                response = model.generate_content(prompt)
-                raw_text = response.text.strip()
-                
-                clean_text = raw_text.replace("```json", "").replace("```", "").strip()
-                data = json.loads(clean_text)
-
-                total_val = data.get("total", "계산 불가")
-                score_val = data.get("score", "0")
-                comment_val = data.get("comment", "분석 실패")
-
-                ws.update_cell(current_row_num, 7, total_val)
-                ws.update_cell(current_row_num, 8, score_val)
-                ws.update_cell(current_row_num, 9, comment_val)
-                
-                updated_count += 1
-                st.success(f"✅ [{date_val}] 분석 완료: {score_val}점")
-                
-                time.sleep(1.5)
-
-            except Exception as e:
-                st.error(f"❌ 분석 실패 ({date_val}): {e}")
-                continue
+            targets.append((row_num, row))
 
-        if not target_found:
+        last_row = start_row + len(rows) - 1
+        if not targets:
+            db.set_state(wm_key, (first_open or last_row + 1) - 1)
             return "⏳ 채점할 과거 데이터가 없습니다. (오늘 데이터는 내일 채점합니다)"
-        
-        if updated_count > 0:
-            return f"🎉 총 {updated_count}건 리포트 작성 완료"
+
+        # 음식표로 모든 음식이 추정되는 날은 LLM 없이 total/점수 계산, 못 찾은 음식이 있는 날만 Gemini 채점
+        results, estimates, llm_targets = {}, {}, targets
+        if local_first:
+            llm_targets = []
+            for row_num, row in targets:
+                est = nutrition.estimate_day(row[1:6])
+                if est.complete:
+                    estimates[row_num] = est
+                    results[row_num] = (est.total_text(), str(est.score), est.comment())
+                else:
+                    llm_targets.append((row_num, row))
+
+        chunks = _chunk_targets(llm_targets, max(1, batch_size), max_prompt_tokens) if llm_targets else []
+        notify("info", f"📍 {len(targets)}일치 식단 분석 중... (로컬 계산 {len(estimates)}일, LLM {len(chunks)}회 요청, 동시 {max_workers}건, 분당 {rpm}회 제한)")
+        # 체크포인트: 아직 기록 안 한(또는 바뀐) 결과를 기록하고, 실패/대기 행/오늘 행 직전까지만 워터마크 전진
+        written = {}
+        def checkpoint():
+            for row_num in sorted(results):
+                if written.get(row_num) == results[row_num]: continue
+                total_val, score_val, comment_val = written[row_num] = results[row_num]
+                db.update_cell("식단", row_num, 7, total_val)
+                db.update_cell("식단", row_num, 8, score_val)
+                db.update_cell("식단", row_num, 9, comment_val)
+            db.flush("식단")
+            open_rows = [row_num for row_num, _ in targets if row_num not in results] + ([first_open] if first_open else [])
+            db.set_state(wm_key, min(open_rows, default=last_row + 1) - 1)
+            if job: job.update(done=len(results), total=len(targets))
+
+        # 행 순서대로 기록 (버퍼 모드: 시트 쓰기는 한 번에 반영, 백그라운드 작업이면 요청 1건마다 반영)
+        with db.batch(), ThreadPoolExecutor(max_workers=max_workers) as pool:
+            if job: checkpoint() # 로컬 계산분 먼저 저장
+            # 로컬 계산한 날은 코멘트만 LLM 으로 다듬기 (선택)
+            comments = {pool.submit(llm.generate, model, build_comment_prompt(row, estimates[row_num]), limiter=limiter, use_cache=use_cache): row_num
+                        for row_num, row in targets if llm_comments and row_num in estimates}
+            pending = {pool.submit(_score_chunk, call, [row for _, row in chunk]): chunk for chunk in chunks}
+            # 진행 상황은 메인 스레드에서만 UI로 출력 (Streamlit은 워커 스레드 출력 불가)
+            while pending:
+                if job and job.cancelled:
+                    for fut in list(pending) + list(comments): fut.cancel()
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    chunk = pending.pop(fut)
+                    try:
+                        scored = fut.result()
+                    except Exception as e:
+                        if len(chunk) == 1:
+                            notify("error", f"❌ 분석 실패 ({chunk[0][1][0]}): {e}")
+                            continue
+                        scored = {}
+                    for row_num, row in chunk:
+                        if row[0] in scored:
+                            results[row_num] = scored[row[0]]
+                            notify("success", f"✅ [{row[0]}] 분석 완료: {results[row_num][1]}점")
+                        else:
+                            # 묶음 응답에서 빠진 날짜 -> 개별 요청으로 보충
+                            notify("warning", f"↩️ [{row[0]}] 일괄 응답 누락, 개별 재분석")
+                            pending[pool.submit(_score_chunk, call, [row])] = [(row_num, row)]
+                if job: checkpoint()
+            for fut, row_num in comments.items():
+                if fut.cancelled(): continue
+                try: results[row_num] = results[row_num][:2] + (fut.result().strip(),)
+                except Exception: pass # 코멘트 실패 시 규칙 기반 코멘트 유지
+            checkpoint()
+
+        if job and job.cancelled:
+            return f"⏹️ 취소됨 - {len(results)}/{len(targets)}건 저장 (다음 실행 때 이어서 처리)"
+        if results:
+            return f"🎉 총 {len(results)}건 리포트 작성 완료 (LLM 캐시 적중률 {llm.get_cache().stats()['hit_rate']:.0%})"
         else:
             return "⚠️ 대상 확인되었으나 업데이트 실패."
 
     except Exception as e:
         return f"🔥 시스템 오류: {str(e)}"
-
-
-
@@ -0,0 +1,172 @@
+import copy
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from gspread.utils import a1_to_rowcol
+
+# ==========================================
+# 네트워크 없이 돌리는 가짜 구글 시트 / Gemini (벤치마크용)
+# DBHandler(client=FakeClient(...)) 로 주입. 호출 수/지연/쿼터 오류를 흉내냄
+# ==========================================
+
+# gspread APIError 대신 쓰는 오류 (llm.is_retryable 과 같은 방식으로 code 를 읽을 수 있음)
+class FakeAPIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"[{code}] {message}")
+        self.code = code
+
+# 호출 수 집계 + 호출당 지연 + 분당 쿼터(초과 시 429) + 무작위 오류
+class FakeAPI:
+    def __init__(self, latency=0.0, quota_per_min=None, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.quota_per_min = quota_per_min
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.errors = Counter()
+        self._window = []  # 최근 60초 내 호출 시각
+        self._random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def call(self, op):
+        with self.lock:
+            self.calls[op] += 1
+            now = time.monotonic()
+            if self.quota_per_min:
+                self._window = [t for t in self._window if now - t < 60]
+                if len(self._window) >= self.quota_per_min:
+                    self.errors["429"] += 1
+                    raise FakeAPIError(429, "Quota exceeded for quota metric 'Read/Write requests' per minute")
+                self._window.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors["503"] += 1
+                raise FakeAPIError(503, "The service is currently unavailable")
+        if self.latency: time.sleep(self.latency)
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.errors.clear()
+            self._window = []
+
+class FakeWorksheet:
+    def __init__(self, api, title, rows):
+        self.api = api
+        self.title = title
+        self.rows = [[str(v) for v in r] for r in rows]
+
+    @property
+    def col_count(self):
+        return max([len(r) for r in self.rows] + [1])
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    def _set(self, row, col, val):
+        while len(self.rows) < row: self.rows.append([])
+        cells = self.rows[row-1]
+        while len(cells) < col: cells.append("")
+        cells[col-1] = "" if val is None else str(val)
+
+    def _write(self, a1, values):
+        r0, c0 = a1_to_rowcol(a1.split(":")[0])
+        for i, vals in enumerate(values):
+            for j, v in enumerate(vals): self._set(r0 + i, c0 + j, v)
+
+    def get_all_values(self):
+        self.api.call("get_all_values")
+        return copy.deepcopy(self.rows)
+
+    # "A{시작}:{열}{끝}" 형식만 지원 (SheetsBackend.get_rows 가 쓰는 범위)
+    def batch_get(self, ranges, **kwargs):
+        self.api.call("batch_get")
+        out = []
+        for rng in ranges:
+            m = re.match(r"A(\d+):[A-Z]+(\d*)$", rng)
+            start, end = int(m.group(1)), int(m.group(2) or len(self.rows))
+            out.append(copy.deepcopy(self.rows[start-1:end]))
+        return out
+
+    def update_cell(self, row, col, val):
+        self.api.call("update_cell")
+        self._set(row, col, val)
+
+    def update(self, a1, values, **kwargs):
+        self.api.call("update")
+        self._write(a1, values)
+
+    def batch_update(self, data, **kwargs):
+        self.api.call("batch_update")
+        for d in data: self._write(d["range"], d["values"])
+
+    def append_row(self, row, **kwargs):
+        self.api.call("append_row")
+        self.rows.append(["" if v is None else str(v) for v in row])
+
+    def append_rows(self, rows, **kwargs):
+        self.api.call("append_rows")
+        self.rows.extend(["" if v is None else str(v) for v in r] for r in rows)
+
+class FakeSpreadsheet:
+    def __init__(self, api, sheets):
+        self.api = api
+        self.sheets = {name: FakeWorksheet(api, name, rows) for name, rows in sheets.items()}
+
+    def worksheet(self, name):
+        self.api.call("worksheet")
+        if name not in self.sheets: raise FakeAPIError(404, f"WorksheetNotFound: {name}")
+        return self.sheets[name]
+
+    def add_worksheet(self, name, rows, cols):
+        self.api.call("add_worksheet")
+        self.sheets[name] = FakeWorksheet(self.api, name, [])
+        return self.sheets[name]
+
+    def worksheets(self):
+        return list(self.sheets.values())
+
+# gspread.authorize(...) 결과 대신 주입 (open 은 이름과 무관하게 같은 문서를 반환)
+class FakeClient:
+    def __init__(self, sheets, **api_options):
+        self.api = FakeAPI(**api_options)
+        self.doc = FakeSpreadsheet(self.api, sheets)
+
+    def open(self, name):
+        return self.doc
+
+# ==========================================
+# 가짜 Gemini 모델: genai.GenerativeModel 과 같은 생성자/generate_content 인터페이스
+# 식단 채점 프롬프트에는 형식에 맞는 JSON, 그 밖에는 짧은 문장을 돌려줌
+# ==========================================
+_DAY_LINE = re.compile(r"- 날짜: (\S+)")
+
+class FakeModel:
+    stats = Counter()  # 모든 인스턴스 합계 (model_name 별 호출 수)
+    latency = 0.0
+    _lock = threading.Lock()
+
+    def __init__(self, model_name="gemini-2.5-flash", generation_config=None, **kwargs):
+        self.model_name = model_name
+        self._generation_config = generation_config or {}
+
+    @classmethod
+    def reset(cls, latency=None):
+        with cls._lock: cls.stats.clear()
+        if latency is not None: cls.latency = latency
+
+    def generate_content(self, prompt, **kwargs):
+        with self._lock: self.stats[self.model_name] += 1
+        if self.latency: time.sleep(self.latency)
+        text = prompt if isinstance(prompt, str) else " ".join(p for p in prompt if isinstance(p, str))
+        day = {"total": "약 1800kcal (탄:150g, 단:160g, 지:50g)", "score": "85", "comment": "단백질 섭취가 충분합니다."}
+        if "JSON 배열" in text:
+            body = json.dumps([{"date": d, **day} for d in _DAY_LINE.findall(text)], ensure_ascii=False)
+        elif "JSON" in text:
+            body = json.dumps(day, ensure_ascii=False)
+        else:
+            body = "수고하셨습니다. 이번 주도 꾸준히 기록하셨습니다."
+        return SimpleNamespace(text=body)
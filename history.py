@@ -0,0 +1,83 @@
+import llm
+
+SUMMARY_PROMPT = """
+다음은 사용자와 AI 비서 '자비스'의 이전 대화 요약과, 그 뒤에 이어진 대화입니다.
+둘을 합쳐 이후 대화에 필요한 사실(기록한 식단/운동, 사용자 요청, 약속한 일)만 남긴 요약을 작성하십시오.
+- 10줄 이내, 항목별 한 줄, 한국어
+[기존 요약]
+{summary}
+[이어진 대화]
+{dialog}
+"""
+
+# 사용자 메시지들 + 그에 대한 모델 답변 1개를 한 턴으로 묶음 (function 메시지는 제외)
+def split_turns(messages):
+    turns, cur = [], []
+    for m in messages:
+        if m["role"] == "function": continue
+        cur.append(m)
+        if m["role"] == "model":
+            turns.append(cur)
+            cur = []
+    if cur: turns.append(cur)
+    return turns
+
+def _analysis(turn, limit=300):
+    reply = next((m["content"] for m in turn if m["role"] == "model"), "")
+    return reply[:limit]
+
+# 지난 턴의 사진은 다시 보내지 않고, 그 턴에서 받은 분석 답변 텍스트로 대체
+def render_turn(turn):
+    out = []
+    for m in turn:
+        if m["role"] == "user":
+            text = f"[사진 - 이전 분석 결과: {_analysis(turn)}]" if "image" in m else m["content"]
+            if out and out[-1]["role"] == "user": out[-1]["parts"].append(text)
+            else: out.append({"role": "user", "parts": [text]})
+        elif m["role"] == "model":
+            out.append({"role": "model", "parts": [m["content"]]})
+    return out
+
+def _turn_text(turn):
+    return "\n".join(part for entry in render_turn(turn) for part in entry["parts"])
+
+# ==========================================
+# 대화 기록 관리: 최근 keep_turns 턴만 원문으로 보내고(토큰 예산 내), 그 이전은 누적 요약 1개로 압축
+# ==========================================
+class HistoryManager:
+    # summarize: 프롬프트 -> 요약 텍스트 (예: llm.generate 를 감싼 함수)
+    def __init__(self, summarize, keep_turns=6, token_budget=2000, summary_chars=800):
+        self.summarize = summarize
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.summary_chars = summary_chars
+
+    # messages: 이번 입력을 제외한 과거 메시지, state: 요약 캐시를 보관할 dict (st.session_state)
+    def build(self, messages, state):
+        turns = split_turns(messages)
+        keep = turns[-self.keep_turns:]
+        costs = [llm.estimate_tokens(_turn_text(t)) for t in keep]
+        while len(keep) > 1 and sum(costs) > self.token_budget:
+            keep, costs = keep[1:], costs[1:]
+        summary = self._summary(turns[:len(turns) - len(keep)], state)
+
+        history = []
+        if summary:
+            history.append({"role": "user", "parts": [f"[이전 대화 요약]\n{summary}"]})
+            history.append({"role": "model", "parts": ["네, 이전 대화 내용을 숙지했습니다."]})
+        for turn in keep: history.extend(render_turn(turn))
+        return history
+
+    # 새로 밀려난 턴만 기존 요약에 합침 (이미 접힌 턴은 다시 요약하지 않음)
+    def _summary(self, dropped, state):
+        cached = state.get("history_summary") or {"turns": 0, "text": ""}
+        if len(dropped) < cached["turns"]: cached = {"turns": 0, "text": ""} # 대화 초기화됨
+        if len(dropped) > cached["turns"]:
+            dialog = "\n".join(_turn_text(t) for t in dropped[cached["turns"]:])
+            try:
+                text = self.summarize(SUMMARY_PROMPT.format(summary=cached["text"] or "(없음)", dialog=dialog)).strip()
+            except Exception:
+                text = f"{cached['text']}\n{dialog}".strip() # 요약 실패 시 원문을 잘라서라도 유지
+            cached = {"turns": len(dropped), "text": text[-self.summary_chars:]}
+        state["history_summary"] = cached
+        return cached["text"]
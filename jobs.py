@@ -0,0 +1,167 @@
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+# ==========================================
+# 백그라운드 작업 실행기: 큐 + 워커 스레드 1개 (시트/LLM 쿼터를 나눠 쓰므로 작업은 한 번에 하나씩)
+# 작업 상태는 상태 저장소(StateStore)에도 남겨 새로고침/재시작 후에도 조회·재개 가능
+# ==========================================
+
+ACTIVE = ("queued", "running")
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, job_id, kind, key, on_change=None):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.status = "queued"
+        self.done = 0
+        self.total = 0
+        self.message = ""
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.logs = deque(maxlen=50)
+        self._cancel = threading.Event()
+        self._on_change = on_change
+        self._saved_at = 0.0
+
+    @property
+    def active(self):
+        return self.status in ACTIVE
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    # 작업 함수 안에서 취소 요청 확인 (요청됐으면 JobCancelled)
+    def check(self):
+        if self.cancelled: raise JobCancelled()
+
+    # 진행 상황 갱신 (저장은 1초에 한 번으로 제한)
+    def update(self, done=None, total=None, message=None):
+        if done is not None: self.done = done
+        if total is not None: self.total = total
+        if message is not None: self.message = message
+        if time.monotonic() - self._saved_at > 1.0: self._save()
+
+    def log(self, message):
+        self.logs.append(message)
+        self.update(message=message)
+
+    def _save(self):
+        self._saved_at = time.monotonic()
+        if self._on_change: self._on_change(self)
+
+    def to_dict(self):
+        return {
+            "id": self.id, "kind": self.kind, "key": self.key, "status": self.status,
+            "done": self.done, "total": self.total, "message": self.message, "result": self.result,
+            "created": self.created, "started": self.started, "finished": self.finished,
+        }
+
+class JobRunner:
+    # state: get/set 을 가진 상태 저장소 (예: db.state). 없으면 메모리에만 보관
+    def __init__(self, state=None, history=20):
+        self.state = state
+        self.history = history
+        self._handlers = {}          # 종류 -> fn(job) -> 결과 문자열
+        self._jobs = OrderedDict()   # id -> Job (최근 history개)
+        self._queue = queue.Queue()
+        self._ids = itertools.count(int(time.time() * 1000))
+        self.lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="jarvis-jobs", daemon=True)
+        self._thread.start()
+
+    def register(self, kind, fn):
+        self._handlers[kind] = fn
+
+    # 같은 key 의 작업이 대기/실행 중이면 새로 만들지 않고 그 작업을 돌려줌 -> (job, 새로 만들었는지)
+    def submit(self, kind, key=None):
+        if kind not in self._handlers: raise KeyError(kind)
+        key = key or kind
+        with self.lock:
+            for job in self._jobs.values():
+                if job.key == key and job.active: return job, False
+            job = Job(f"{kind}-{next(self._ids)}", kind, key, on_change=self._persist)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                old_id = next((i for i, j in self._jobs.items() if not j.active), None)
+                if old_id is None: break
+                del self._jobs[old_id]
+        self._persist(job)
+        self._queue.put(job)
+        return job, True
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job and job.active:
+            job.cancel()
+            if job.status == "queued": self._finish(job, "cancelled", "실행 전 취소됨")
+        return job
+
+    # 워커 스레드 종료 (대기 중인 작업을 다 처리한 뒤)
+    def close(self):
+        self._queue.put(None)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self.lock:
+            return list(reversed(self._jobs.values()))
+
+    def active(self):
+        return [job for job in self.jobs() if job.active]
+
+    # 이전 프로세스에서 끝나지 못한 작업을 다시 큐에 넣음 (각 작업은 체크포인트/워터마크부터 이어서 처리)
+    def resume_interrupted(self):
+        if not self.state: return []
+        resumed = []
+        for info in self.state.get("jobs:index", []) or []:
+            if info.get("status") in ACTIVE and info.get("kind") in self._handlers:
+                job, created = self.submit(info["kind"], info.get("key"))
+                if created: resumed.append(job)
+        return resumed
+
+    def _persist(self, job=None):
+        if not self.state: return
+        with self.lock:
+            index = [j.to_dict() for j in self._jobs.values()]
+            # 이전 실행의 기록은 현재 목록에 없는 것만 남겨 최근 history개 유지
+            old = [i for i in (self.state.get("jobs:index", []) or []) if i["id"] not in self._jobs]
+            for i in old:
+                if i.get("status") in ACTIVE: i["status"] = "interrupted"
+            self.state.set("jobs:index", (old + index)[-self.history:])
+
+    def _finish(self, job, status, result):
+        job.status = status
+        job.result = result
+        job.finished = time.time()
+        job._save()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None: return
+            if job.status != "queued": continue # 대기 중 취소됨
+            job.status = "running"
+            job.started = time.time()
+            job._save()
+            try:
+                result = self._handlers[job.kind](job)
+                if not job.cancelled: job.done = job.total
+                self._finish(job, "cancelled" if job.cancelled else "done", result)
+            except JobCancelled:
+                self._finish(job, "cancelled", "취소됨 (처리한 부분까지 저장됨)")
+            except Exception as e:
+                self._finish(job, "failed", f"오류: {e}")
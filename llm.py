@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import metrics
+
+CACHE_PATH = os.environ.get("JARVIS_LLM_CACHE_PATH", "llm_cache.sqlite")
+CACHE_ENABLED = os.environ.get("JARVIS_LLM_CACHE", "on").lower() not in ("0", "off", "false")
+
+# ==========================================
+# Gemini 호출 공용 유틸 (속도 제한 + 재시도)
+# ==========================================
+
+# 토큰 버킷 속도 제한기: 분당 rpm회까지 허용, burst만큼 몰아서 호출 가능 (스레드 안전)
+class RateLimiter:
+    def __init__(self, rpm=30, burst=4):
+        self.rate = rpm / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# 대략적인 토큰 수 추정 (한글은 글자당 약 1토큰, 영문/숫자는 약 4글자당 1토큰)
+def estimate_tokens(text):
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + ascii_chars // 4
+
+# 429(쿼터 초과) / 5xx(서버 오류)만 재시도 대상
+def is_retryable(e):
+    code = getattr(e, "code", None)
+    if callable(code): code = code()
+    try: code = int(code)
+    except (TypeError, ValueError): code = None
+    if code is not None: return code == 429 or 500 <= code < 600
+    return bool(re.search(r"\b(429|50[0-4])\b|Resource has been exhausted", str(e)))
+
+# ==========================================
+# 응답 캐시: (모델명, 생성 설정, 프롬프트) 해시 -> 응답 텍스트 (SQLite, 용량 초과 시 LRU 제거)
+# ==========================================
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=50 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response TEXT, size INTEGER, accessed REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0] # 이후는 put/삭제 때 증감
+
+    @staticmethod
+    def make_key(model, prompt):
+        config = getattr(model, "_generation_config", None) or {}
+        raw = json.dumps([getattr(model, "model_name", str(model)), config, prompt], sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return row[0]
+
+    def put(self, key, text):
+        size = len(text.encode("utf-8"))
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)", (key, text, size, time.time()))
+            self.total_bytes += size - (old[0] if old else 0)
+            # 용량 초과 시에만 가장 오래 안 쓴 항목부터 조금씩 제거 (평소 삽입은 전체 스캔 없음)
+            while self.total_bytes > self.max_bytes:
+                victims = self.conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed LIMIT 32").fetchall()
+                if not victims: break
+                for old_key, old_size in victims:
+                    if self.total_bytes <= self.max_bytes: break
+                    self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (old_key,))
+                    self.total_bytes -= old_size
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM llm_cache")
+            self.conn.commit()
+            self.total_bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        entries = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0, "entries": entries}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None: _cache = ResponseCache()
+    return _cache
+
+# use_cache=False 또는 환경변수 JARVIS_LLM_CACHE=off 면 캐시를 건너뜀 (텍스트 프롬프트만 캐시)
+# validate가 주어지면 검증(예외 없음)을 통과한 응답만 캐시에 저장
+def generate(model, prompt, limiter=None, retries=4, base_delay=2.0, use_cache=True, validate=None):
+    cache = get_cache() if use_cache and CACHE_ENABLED and isinstance(prompt, str) else None
+    key = cache.make_key(model, prompt) if cache else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None: return cached
+
+    for attempt in range(retries + 1):
+        if limiter: limiter.acquire()
+        try:
+            with metrics.track("gemini", "generate_content"):
+                text = model.generate_content(prompt).text
+            break
+        except Exception as e:
+            if attempt == retries or not is_retryable(e): raise
+            time.sleep(base_delay * (2 ** attempt) + random.uniform(0, 1)) # 지수 백오프 + 지터
+
+    if cache:
+        try:
+            if validate: validate(text)
+            cache.put(key, text)
+        except ValueError: pass
+    return text
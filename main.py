@@ -1,33 +1,54 @@
+import time
+RERUN_START = time.perf_counter()
+
 import streamlit as st
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
-from PIL import Image
-import time
+from contextlib import contextmanager
 
-# 모듈 불러오기
+# 모듈 불러오기 (diet/workout/report/PIL 은 실제로 쓰일 때만 지연 import - 콜드 스타트 단축)
+import agent
 import config
 import database
-import diet
-import workout
-import report
+import history
+import jobs
+import llm
+import metrics
+
+# 실행 구간별 소요 시간(ms) - 사이드바에 표시
+timings = {}
+
+@contextmanager
+def timed(name):
+    t = time.perf_counter()
+    try: yield
+    finally: timings[name] = (time.perf_counter() - t) * 1000
 
 # 1. 기본 설정
 st.set_page_config(page_title="Project Jarvis", page_icon="👔", layout="wide")
 st.markdown("<style>.stToast { background-color: #333; color: white; border-radius: 10px; }</style>", unsafe_allow_html=True)
 
-# 2. API 연결
+# 2. API 연결 (프로세스 전체에서 1회만 - Streamlit 재실행마다 OAuth/시트 열기 반복 방지)
+@st.cache_resource(show_spinner="자비스 연결 중...")
+def get_db():
+    genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+    # 로컬 SQLite가 주 저장소 (채팅 기록은 즉시 로컬 반영, 구글 시트는 백그라운드 동기화)
+    return database.DBHandler(local_path="jarvis_local.db")
+
 try:
     if "GEMINI_API_KEY" not in st.secrets:
         st.error("Secrets에 GEMINI_API_KEY가 없습니다."); st.stop()
-    
-    genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
-    db = database.DBHandler()
+    with timed("DB 연결"):
+        db = get_db()
+    # 시트 연결 실패(일시적인 OAuth/네트워크 오류)는 캐시에 남기지 않음 - 이번 실행은 로컬 사본으로 계속, 다음 재실행 때 다시 연결
+    if db.remote is None: get_db.clear()
 except Exception as e:
     st.error(f"초기 연결 실패: {e}"); st.stop()
 
 # 3. 도구(Tools) 정의
 def tool_log_diet(menu: str, amount: str, meal_type: str):
     """식단을 기록합니다."""
+    import diet
     res = diet.log_diet(db, menu, amount, meal_type)
     if res == "success": 
         return f"성공: {meal_type}에 '{menu}'({amount}) 저장 완료."
@@ -35,6 +56,7 @@ def tool_log_diet(menu: str, amount: str, meal_type: str):
 
 def tool_log_workout(target_sheet: str, exercise: str, sets: str, weight: str, reps: str):
     """운동을 기록합니다."""
+    import workout
     res = workout.log_workout(db, target_sheet, exercise, sets, weight, reps)
     if res == "success": 
         return f"성공: {target_sheet} 운동 '{exercise}' 저장 완료."
@@ -47,7 +69,13 @@ def tool_save_memory(fact: str):
         return "성공: 기억 저장 완료."
     return f"실패: {res}"
 
-tools = [tool_log_diet, tool_log_workout, tool_save_memory]
+def tool_workout_history(exercise: str, days: int):
+    """운동 기록을 조회합니다. exercise 종목의 최근 days일 추이(세트/최고중량/추정 1RM/볼륨)를 돌려주고, exercise 가 비어 있으면 주간 부위별 볼륨을 돌려줍니다."""
+    import analytics
+    return analytics.describe(db.workout_store(), exercise, int(days or 56))
+
+tools = [tool_log_diet, tool_log_workout, tool_save_memory, tool_workout_history]
+tool_map = {f.__name__: f for f in tools}
 
 # 4. 모델 준비 (안전설정 해제 포함)
 safety_settings = {
@@ -57,44 +85,133 @@ safety_settings = {
     HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
 }
 
-try:
-    memory_context = db.load_memory()
-    system_instruction = config.get_system_prompt(memory_context)
-    model = genai.GenerativeModel(
+# 시스템 프롬프트(관련 기억/날짜)가 같으면 모델 객체 재사용
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_model(system_instruction):
+    return genai.GenerativeModel(
         "gemini-2.5-flash", 
         tools=tools, 
         system_instruction=system_instruction,
         safety_settings=safety_settings 
     )
-except Exception as e:
-    st.error(f"모델 로드 실패: {e}")
+
+# 대화 기록 관리 (최근 턴만 원문, 이전 턴은 누적 요약 - 턴당 전송량이 대화 길이와 무관하게 일정)
+@st.cache_resource(show_spinner=False)
+def get_history_manager():
+    summary_model = genai.GenerativeModel("gemini-2.5-flash", generation_config={"temperature": 0.2})
+    return history.HistoryManager(lambda p: llm.generate(summary_model, p), keep_turns=6, token_budget=2000)
+
+# 기억 인덱스는 db 와 함께 프로세스 전체에서 유지 (최초 1회만 기억_DB 읽기)
+with timed("기억 인덱스"):
+    memory_index = db.memory_index()
+
+# 백그라운드 작업 (식단 채점/운동 통계/코멘트/리포트) - 프로세스당 1개, 이전 실행에서 끊긴 작업은 이어서 재개
+def job_diet_score(job):
+    import diet
+    return diet.batch_score(db, job=job)
+
+def job_workout_stats(job):
+    import workout
+    return workout.batch_calculate(db, job=job)
+
+def job_workout_notes(job):
+    import workout
+    return f"✅ {workout.generate_notes(db, job=job)}건 코멘트 작성 완료"
+
+JOB_LABELS = {"diet_score": "🥗 식단 채점", "workout_stats": "🏋️ 운동 통계", "workout_notes": "📝 운동 코멘트", "weekly_report": "📧 주간 리포트"}
+JOB_STATUS = {"queued": "대기", "running": "실행 중", "done": "완료", "failed": "실패", "cancelled": "취소됨"}
+
+@st.cache_resource(show_spinner=False)
+def get_job_runner():
+    email, pw = st.secrets.get("GMAIL_ID"), st.secrets.get("GMAIL_APP_PW") # 작업 스레드에서는 secrets 를 읽지 않도록 미리
+    def job_weekly_report(job):
+        import report
+        job.update(done=0, total=1, message="리포트 작성 중")
+        return report.send_weekly_report(db, email, pw)
+
+    runner = jobs.JobRunner(db.state)
+    runner.register("diet_score", job_diet_score)
+    runner.register("workout_stats", job_workout_stats)
+    runner.register("workout_notes", job_workout_notes)
+    runner.register("weekly_report", job_weekly_report)
+    runner.resume_interrupted()
+    return runner
+
+# 캐시된 자원 명시적 무효화 (시트를 직접 고쳤거나 연결을 새로 맺어야 할 때) - 다음 재실행 때 새로 만듦
+# 작업기는 실행 중인 작업이 없을 때만 교체 (진행 중인 작업은 기존 연결로 끝까지 처리)
+def reset_resources():
+    db.invalidate()
+    get_db.clear()
+    get_model.clear()
+    runner = get_job_runner()
+    if not runner.active():
+        runner.close()
+        get_job_runner.clear()
+
+def submit_job(kind):
+    job, created = get_job_runner().submit(kind)
+    if created: st.toast(f"{JOB_LABELS[kind]} 작업을 시작합니다.", icon="⏳")
+    else: st.toast(f"{JOB_LABELS[kind]} 작업이 이미 진행 중입니다.", icon="ℹ️")
+
+def job_panel():
+    for job in get_job_runner().jobs()[:4]:
+        label = JOB_LABELS.get(job.kind, job.kind)
+        if job.active:
+            ratio = min(1.0, job.done / job.total) if job.total else 0.0
+            st.progress(ratio, text=f"{label} ({JOB_STATUS[job.status]} {job.done}/{job.total}) {job.message}")
+            if st.button("⏹️ 취소", key=f"cancel-{job.id}"): get_job_runner().cancel(job.id)
+        else:
+            st.caption(f"{label} - {JOB_STATUS.get(job.status, job.status)}: {job.result}")
 
 # 5. 화면 구성 (사이드바 메뉴 복구 완료)
 st.title("Project Jarvis 👔")
 
 with st.sidebar:
     st.header("🎛️ 업무 지시")
+    # 일괄 작업은 백그라운드 작업으로 실행 (화면을 막지 않고, 같은 작업은 중복 실행 안 됨)
+    runner = get_job_runner()
     # [복구됨] 식단 채점 버튼
-    if st.button("🥗 식단 일괄 채점"):
-        with st.spinner("채점 중..."): 
-            st.info(diet.batch_score(db))
-    
+    if st.button("🥗 식단 일괄 채점"): submit_job("diet_score")
+
     # [복구됨] 운동 통계 버튼
-    if st.button("🏋️ 운동 통계 업데이트"):
-        with st.spinner("계산 중..."): 
-            st.info(workout.batch_calculate(db))
-            
+    if st.button("🏋️ 운동 통계 업데이트"): submit_job("workout_stats")
+
+    # 코치 코멘트는 LLM 호출이라 느리므로 별도 단계로 분리
+    if st.button("📝 운동 코멘트 생성"): submit_job("workout_notes")
+
+    # 주간 집계만 보기 (LLM 호출 없음)
+    if st.button("📊 주간 요약 보기"):
+        import report
+        st.text(report.format_summary(report.weekly_summary(db)))
+
     # [복구됨] 리포트 발송 버튼
-    if st.button("📧 주간 리포트 발송"):
-        with st.spinner("발송 중..."): 
-            email = st.secrets.get("GMAIL_ID")
-            pw = st.secrets.get("GMAIL_APP_PW")
-            st.info(report.send_weekly_report(db, email, pw))
-            
+    if st.button("📧 주간 리포트 발송"): submit_job("weekly_report")
+
+    # 작업 상태는 실행 중인 작업이 있을 때만 2초마다 이 부분만 다시 그림 (스크립트 전체 재실행 없음)
+    st.fragment(run_every=2 if runner.active() else None)(job_panel)()
+
     st.divider()
+    cache_stats = llm.get_cache().stats()
+    sync = db.sync_status()
+    if sync:
+        st.caption(f"🔁 시트 동기화: 대기 {sync['pending']}건, 충돌 {sync['conflicts']}건" + (f" (오류: {sync['last_error']})" if sync['last_error'] else ""))
+        for sheet, error in sync["sheet_errors"].items(): st.caption(f"⚠️ '{sheet}' 동기화 대기 중: {error}")
+    st.caption(f"🗃️ LLM 캐시: 적중률 {cache_stats['hit_rate']:.0%} ({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']}), 저장 {cache_stats['entries']}건")
+    # 외부 호출 지표 (시트/Gemini 작업별 호출 수, 오류, 429, 지연 분포)
+    with st.expander("📈 API 지표"):
+        api_stats = metrics.registry.snapshot()
+        if api_stats: st.dataframe(api_stats, hide_index=True, use_container_width=True)
+        else: st.caption("아직 호출 기록이 없습니다.")
+        sheets_throttle = metrics.registry.throttles.get("sheets")
+        if sheets_throttle:
+            st.caption(f"시트 최근 1분 호출 {len(metrics.registry.recent('sheets'))}/{sheets_throttle.limit}회, 한도 대비 대기 누적 {sheets_throttle.waited:.1f}초")
+    st.toggle("⚡ 스트리밍 응답", value=config.STREAM_RESPONSES, key="stream_responses")
     if st.button("🔄 대화 초기화"):
         st.session_state.messages = []
         st.rerun()
+    if st.button("🔌 다시 연결"):
+        reset_resources()
+        st.rerun()
 
 # 채팅창 표시
 if "messages" not in st.session_state: st.session_state.messages = []
@@ -115,82 +232,106 @@ if prompt := st.chat_input("지시를 내려주십시오."):
     
     with st.chat_message("user"):
         if uploaded_file:
-            img = Image.open(uploaded_file)
+            import vision
+            # 디코딩 1회 -> 축소/재압축 -> 해시 (같은 사진이면 이전 분석 결과 재사용)
+            with timed("사진 전처리"):
+                img, img_jpeg, img_hash = vision.prepare_image(uploaded_file.getvalue(), config.IMAGE_MAX_SIDE, config.IMAGE_JPEG_QUALITY)
+                img_analysis = vision.cached_analysis(db, img_hash)
             st.image(img, width=250)
             st.session_state.messages.append({"role":"user", "content":"[사진]", "image":img})
         st.markdown(prompt)
         st.session_state.messages.append({"role":"user", "content":prompt})
 
     try:
-        # 히스토리 구성
-        history = []
-        for m in st.session_state.messages:
-            if m["role"] == "user":
-                parts = [m["content"]]
-                if "image" in m: parts.append(m["image"])
-                history.append({"role":"user", "parts":parts})
-            elif m["role"] == "model":
-                history.append({"role":"model", "parts":[m["content"]]})
+        # 히스토리 구성 (이번 턴 메시지는 제외 - 현재 입력은 curr_parts 로 전송)
+        past = st.session_state.messages
+        while past and past[-1]["role"] == "user": past = past[:-1]
+        with timed("히스토리 구성"):
+            chat_history = get_history_manager().build(past, st.session_state)
         
         # 입력 구성 (사진 들어오면 강제 명령 추가)
         curr_parts = []
-        if uploaded_file and not any("image" in m for m in st.session_state.messages[-1:]):
-            img_input = Image.open(uploaded_file)
-            curr_parts.append(img_input)
+        if uploaded_file and img_analysis:
+            # 이미 분석한 사진 -> 이미지 전송 없이 이전 분석 결과만 전달
+            curr_parts.append(f"{prompt}\n(시스템 명령: 이전에 분석한 것과 같은 사진입니다. 이전 분석 결과: {img_analysis}\n이 결과를 바탕으로 즉시 'tool_log_diet' 도구를 사용하여 기록해라.)")
+        elif uploaded_file:
+            curr_parts.append({"mime_type": "image/jpeg", "data": img_jpeg})
             curr_parts.append(f"{prompt}\n(시스템 명령: 이 사진의 음식 메뉴와 양을 분석하고, 즉시 'tool_log_diet' 도구를 사용하여 기록해라. 분석 결과만 말하지 말고 반드시 도구를 실행해.)")
         else:
             curr_parts.append(prompt)
 
-        # 챗 실행
-        chat = model.start_chat(history=history[:-1])
-        response = chat.send_message(curr_parts)
+        # 모델 준비 (현재 메시지와 관련된 기억만 시스템 프롬프트에 포함)
+        with timed("기억 검색 + 모델 준비"):
+            system_instruction = config.get_system_prompt(memory_index, prompt)
+            model = get_model(system_instruction)
 
-        # 도구 사용 루프
-        executed_tools = []
-        
-        while response.candidates and response.parts and response.parts[0].function_call:
-            fc = response.parts[0].function_call
-            fname = fc.name
-            fargs = dict(fc.args)
-
-            st.toast(f"🤖 자비스가 [{fname}] 수행 중...", icon="⚙️")
-            
-            tool_func = locals().get(fname)
-            if tool_func:
-                tool_result = tool_func(**fargs)
-                executed_tools.append(tool_result)
-            else:
-                tool_result = "Error: 도구 없음"
-            
-            response = chat.send_message(
-                genai.protos.Content(
-                    parts=[genai.protos.Part(
-                        function_response=genai.protos.FunctionResponse(
-                            name=fname,
-                            response={"result": tool_result}
-                        )
-                    )]
-                )
-            )
-
-        # 최종 응답 출력
-        final_text = ""
-        try:
-            if response.text:
-                final_text = response.text
-        except ValueError:
-            if executed_tools:
-                final_text = f"✅ 처리 완료되었습니다.\n\n[실행 결과]\n" + "\n".join(executed_tools)
-            else:
-                final_text = "시스템: 응답을 생성하지 못했습니다. (사진 분석 실패 가능성)"
-        
-        if not final_text and executed_tools:
-             final_text = f"✅ 기록을 완료했습니다.\n" + "\n".join(executed_tools)
+        # 챗 실행 + 도구 사용 루프 (한 응답의 도구 호출은 병렬 실행 후 결과를 한 번에 회신)
+        chat = model.start_chat(history=chat_history)
+        turn_args = dict(
+            resource_of=lambda name, args: args.get("target_sheet", name), # 같은 시트를 쓰는 도구끼리는 순서대로
+            on_call=lambda name, args: st.toast(f"🤖 자비스가 [{name}] 수행 중...", icon="⚙️"),
+        )
+        if st.session_state.get("stream_responses", config.STREAM_RESPONSES):
+            # 스트리밍: 받은 조각을 바로 표시하고, 도구 호출은 응답 도중에 바로 실행
+            with st.chat_message("assistant"):
+                placeholder = st.empty()
+                shown = []
+                def show(piece):
+                    shown.append(piece)
+                    placeholder.markdown("".join(shown) + "▌")
+                final_text, executed_tools, tool_timings, latency = agent.run_turn_stream(chat, curr_parts, tool_map, on_text=show, **turn_args)
+                model_text = final_text
+                if not final_text:
+                    final_text = ("✅ 기록을 완료했습니다.\n" + "\n".join(executed_tools)) if executed_tools else "시스템: 응답을 생성하지 못했습니다. (사진 분석 실패 가능성)"
+                placeholder.markdown(final_text)
+        else:
+            t = time.perf_counter()
+            response, executed_tools, tool_timings = agent.run_turn(chat, curr_parts, tool_map, **turn_args)
+            latency = {"total_ms": (time.perf_counter() - t) * 1000}
+
+            # 최종 응답 출력
+            final_text = model_text = ""
+            try:
+                if response.text:
+                    final_text = model_text = response.text
+            except ValueError:
+                if executed_tools:
+                    final_text = f"✅ 처리 완료되었습니다.\n\n[실행 결과]\n" + "\n".join(executed_tools)
+                else:
+                    final_text = "시스템: 응답을 생성하지 못했습니다. (사진 분석 실패 가능성)"
+
+            if not final_text and executed_tools:
+                 final_text = f"✅ 기록을 완료했습니다.\n" + "\n".join(executed_tools)
+            st.chat_message("assistant").markdown(final_text)
+
+        for name, ms in tool_timings:
+            timings[f"도구 {name}"] = timings.get(f"도구 {name}", 0) + ms
+        # 응답 지연 기록 (첫 토큰은 스트리밍 모드에서만 측정) - 모드별 평균을 사이드바에 표시
+        if "ttft_ms" in latency: timings["첫 토큰"] = latency["ttft_ms"]
+        timings["응답 전체"] = latency["total_ms"]
+        mode = "스트리밍" if "ttft_ms" in latency else "일괄"
+        st.session_state.setdefault("turn_latency", []).append((mode, latency.get("ttft_ms"), latency["total_ms"]))
 
-        st.chat_message("assistant").markdown(final_text)
         st.session_state.messages.append({"role":"model", "content":final_text})
+        # 사진 분석 결과는 모델이 실제로 답한 텍스트만 저장 (실패 안내/도구 결과 문구가 다음 업로드의 "이전 분석 결과"가 되지 않도록)
+        if uploaded_file and not img_analysis and model_text: vision.save_analysis(db, img_hash, model_text)
         
         if uploaded_file: st.rerun()
 
     except Exception as e:
         st.error(f"오류 발생: {e}")
+
+# 실행 시간 표시 (채팅 처리까지 끝난 뒤 사이드바 맨 아래에 추가)
+with st.sidebar.expander("⏱️ 실행 시간"):
+    for name, ms in timings.items(): st.caption(f"{name}: {ms:.1f} ms")
+    if "last_rerun_ms" in st.session_state:
+        st.caption(f"직전 재실행 전체: {st.session_state.last_rerun_ms:.1f} ms")
+    for mode in ("스트리밍", "일괄"):
+        turns = [t for t in st.session_state.get("turn_latency", []) if t[0] == mode][-20:]
+        if not turns: continue
+        avg_total = sum(t[2] for t in turns) / len(turns)
+        avg_ttft = sum(t[1] for t in turns) / len(turns) if mode == "스트리밍" else avg_total # 일괄 모드는 전체 완료 시점에 처음 표시됨
+        st.caption(f"{mode} 응답 평균 ({len(turns)}턴): 첫 표시 {avg_ttft:.0f} ms / 전체 {avg_total:.0f} ms")
+
+# 이번 재실행 전체 소요 시간 (다음 재실행 때 표시)
+st.session_state.last_rerun_ms = (time.perf_counter() - RERUN_START) * 1000
@@ -0,0 +1,82 @@
+import heapq
+import itertools
+import math
+import re
+import threading
+from collections import defaultdict
+import llm
+
+# 한글은 조사/어미가 붙어도 맞도록 단어 + 글자 2-gram, 영문/숫자는 단어 단위
+def tokenize(text):
+    tokens = []
+    for word in re.findall(r"[가-힣]+|[a-z0-9]+", text.lower()):
+        tokens.append(word)
+        if len(word) > 2 and "가" <= word[0] <= "힣":
+            tokens.extend(word[i:i+2] for i in range(len(word) - 1))
+    return tokens
+
+# ==========================================
+# 기억 검색 인덱스 (BM25, 역색인) - save_memory 할 때마다 한 건씩 추가
+# ==========================================
+class MemoryIndex:
+    # max_postings: 검색어 토큰 하나당 훑는 최대 문서 수 (흔한 2-gram 은 최근 기억부터 이만큼만 - idf 가 낮아 순위 영향이 작음)
+    def __init__(self, k1=1.5, b=0.75, max_postings=256):
+        self.k1 = k1
+        self.b = b
+        self.max_postings = max_postings
+        self.facts = []
+        self.doc_len = []
+        self.total_len = 0
+        self.postings = defaultdict(dict) # 토큰 -> {fact 번호: 빈도} (번호 오름차순)
+        self._norms = []                  # 문서 길이 정규화 값 (추가 시 이어 붙이고, 평균 길이가 10% 넘게 바뀌면 다시 계산)
+        self._avg_len = 0.0               # _norms 계산에 쓴 평균 길이
+        self.lock = threading.Lock()
+
+    def _norm(self, dl):
+        return self.k1 * (1 - self.b + self.b * dl / self._avg_len)
+
+    def add(self, fact):
+        tokens = tokenize(fact)
+        with self.lock:
+            doc_id = len(self.facts)
+            self.facts.append(fact)
+            self.doc_len.append(len(tokens))
+            self.total_len += len(tokens)
+            for t in tokens:
+                self.postings[t][doc_id] = self.postings[t].get(doc_id, 0) + 1
+            avg_len = self.total_len / len(self.facts) or 1
+            if abs(avg_len - self._avg_len) > 0.1 * self._avg_len:
+                self._avg_len = avg_len
+                self._norms = [self._norm(dl) for dl in self.doc_len]
+            else: self._norms.append(self._norm(len(tokens)))
+
+    def search(self, query, k=8):
+        with self.lock:
+            n = len(self.facts)
+            if not n: return []
+            norms = self._norms
+            scores = defaultdict(float)
+            for t in set(tokenize(query)):
+                docs = self.postings.get(t)
+                if not docs: continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) * (self.k1 + 1)
+                items = docs.items() if len(docs) <= self.max_postings else itertools.islice(reversed(docs.items()), self.max_postings)
+                for doc_id, tf in items:
+                    scores[doc_id] += idf * tf / (tf + norms[doc_id])
+            return heapq.nlargest(k, scores, key=lambda d: (scores[d], d))
+
+    # 관련도 상위 k개 + 최근 기억 recent개를 토큰 예산 안에서 선택 (시간순 정렬)
+    def top_facts(self, query, k=8, recent=3, token_budget=400):
+        with self.lock:
+            latest = list(range(len(self.facts) - 1, max(-1, len(self.facts) - 1 - recent), -1))
+        chosen, used = [], 0
+        for doc_id in self.search(query, k) + latest:
+            if doc_id in chosen: continue
+            cost = llm.estimate_tokens(self.facts[doc_id]) + 2
+            if used + cost > token_budget: continue
+            chosen.append(doc_id)
+            used += cost
+        return [self.facts[d] for d in sorted(chosen)]
+
+    def __len__(self):
+        return len(self.facts)
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+SHEETS_RPM = int(os.environ.get("JARVIS_SHEETS_RPM", "60"))
+
+# ==========================================
+# 외부 호출 계측: (서비스, 작업)별 호출 수 / 오류 / 429 / 지연 히스토그램 (프로세스 전체 공용, 스레드 안전)
+# ==========================================
+
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000) # 마지막 칸은 그 이상
+
+def is_quota_error(e):
+    code = getattr(e, "code", None)
+    if callable(code): code = code()
+    if str(code) == "429": return True
+    text = str(e)
+    return "429" in text or "Quota exceeded" in text or "Resource has been exhausted" in text
+
+class OpStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.quota_errors = 0
+        self.total_ms = 0.0
+        self.hist = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms, error=None):
+        self.count += 1
+        self.total_ms += ms
+        self.hist[bisect_left(BUCKETS_MS, ms)] += 1
+        if error is not None:
+            self.errors += 1
+            if is_quota_error(error): self.quota_errors += 1
+
+    # 히스토그램 구간 상한으로 근사한 백분위 (ms)
+    def percentile(self, q):
+        if not self.count: return 0.0
+        target, seen = q * self.count, 0
+        for i, n in enumerate(self.hist):
+            seen += n
+            if seen >= target: return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else float("inf")
+        return float("inf")
+
+class Metrics:
+    def __init__(self):
+        self.ops = {}          # (서비스, 작업) -> OpStats
+        self._starts = {}      # 서비스 -> 최근 호출 시작 시각 deque
+        self._quota_hits = {}  # 서비스 -> 최근 429 시각 deque
+        self.throttles = {}    # 서비스 -> AdaptiveThrottle
+        self.lock = threading.Lock()
+
+    def begin(self, service):
+        with self.lock:
+            self._starts.setdefault(service, deque(maxlen=1000)).append(time.monotonic())
+
+    def record(self, service, op, ms, error=None):
+        with self.lock:
+            self.ops.setdefault((service, op), OpStats()).add(ms, error)
+            if error is not None and is_quota_error(error):
+                self._quota_hits.setdefault(service, deque(maxlen=100)).append(time.monotonic())
+
+    # 최근 window초 안에 시작한 호출 시각 (오래된 순)
+    def recent(self, service, window=60.0):
+        now = time.monotonic()
+        with self.lock:
+            return [t for t in self._starts.get(service, ()) if now - t < window]
+
+    def recent_quota_errors(self, service, window=60.0):
+        now = time.monotonic()
+        with self.lock:
+            return sum(1 for t in self._quota_hits.get(service, ()) if now - t < window)
+
+    # 외부 호출 1회 계측 (해당 서비스에 스로틀이 있으면 먼저 대기). 예외는 기록 후 그대로 전파
+    @contextmanager
+    def track(self, service, op):
+        throttle = self.throttles.get(service)
+        if throttle: throttle.acquire()
+        else: self.begin(service)
+        t = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(service, op, (time.perf_counter() - t) * 1000, e)
+            raise
+        self.record(service, op, (time.perf_counter() - t) * 1000)
+
+    def call(self, service, op, fn, *args, **kwargs):
+        with self.track(service, op):
+            return fn(*args, **kwargs)
+
+    def snapshot(self):
+        with self.lock:
+            items = sorted(self.ops.items())
+        return [{
+            "service": service, "op": op, "count": s.count, "errors": s.errors, "429": s.quota_errors,
+            "avg_ms": round(s.total_ms / s.count, 1) if s.count else 0.0,
+            "p50_ms": s.percentile(0.5), "p95_ms": s.percentile(0.95),
+        } for (service, op), s in items]
+
+    def histogram(self, service, op):
+        with self.lock:
+            s = self.ops.get((service, op))
+            return list(s.hist) if s else [0] * (len(BUCKETS_MS) + 1)
+
+    def reset(self):
+        with self.lock:
+            self.ops.clear()
+            self._starts.clear()
+            self._quota_hits.clear()
+
+# ==========================================
+# 적응형 스로틀: 계측된 최근 호출 수가 분당 한도의 headroom 비율에 닿으면 429 가 나기 전에 대기
+# 최근 429 를 받았으면 한도를 절반으로 낮춰 더 일찍 늦춤
+# ==========================================
+class AdaptiveThrottle:
+    def __init__(self, metrics, service, limit=60, window=60.0, headroom=0.9):
+        self.metrics = metrics
+        self.service = service
+        self.limit = limit
+        self.window = window
+        self.headroom = headroom
+        self.waited = 0.0  # 누적 대기 시간(초)
+        self.lock = threading.Lock()
+
+    def budget(self):
+        budget = self.limit * self.headroom
+        if self.metrics.recent_quota_errors(self.service, self.window): budget = self.limit * 0.5
+        return max(1, int(budget))
+
+    # 대기 판단과 호출 시작 기록을 한 잠금 안에서 처리 (여러 스레드가 동시에 한도를 넘지 않도록)
+    def acquire(self):
+        with self.lock:
+            while True:
+                budget = self.budget()
+                recent = self.metrics.recent(self.service, self.window)
+                if len(recent) < budget: break
+                wait = recent[len(recent) - budget] + self.window - time.monotonic()
+                if wait > 0:
+                    wait = min(wait, 5.0)
+                    self.waited += wait
+                    time.sleep(wait)
+            self.metrics.begin(self.service)
+
+registry = Metrics()
+
+def set_throttle(service, limit):
+    if limit: registry.throttles[service] = AdaptiveThrottle(registry, service, limit=limit)
+    else: registry.throttles.pop(service, None)
+
+# 구글 시트: 사용자당 분당 60회 한도 (JARVIS_SHEETS_RPM=0 이면 스로틀 끔)
+set_throttle("sheets", SHEETS_RPM)
+
+track = registry.track
+call = registry.call
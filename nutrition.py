@@ -0,0 +1,241 @@
+import difflib
+import re
+
+# ==========================================
+# 로컬 영양 추정기: 음식표 + 한글 이름 유사 매칭 + 양 파싱 -> total 열/점수를 LLM 없이 계산
+# (채점 규칙은 diet.SCORING_RULES 와 같은 내용을 코드로 옮긴 것)
+# ==========================================
+
+# 이름: (1회 제공량 g, kcal, 탄, 단, 지, 분류, {단위: 제공량 배수})
+# 분류: refined(정제 탄수화물/당류), bad_fat(튀김/기름진 부위), substitute(대체 식품), processed(가공), clean(자연식)
+FOODS = {
+    "잡곡밥": (210, 300, 65, 6, 2, "clean", {"공기": 1}),
+    "현미밥": (210, 310, 66, 6, 2, "clean", {"공기": 1}),
+    "쌀밥": (210, 315, 69, 5, 1, "clean", {"공기": 1}),
+    "햇반": (210, 315, 69, 5, 1, "clean", {"개": 1}),
+    "닭가슴살": (100, 110, 0, 23, 1, "clean", {"팩": 1, "개": 1, "덩이": 1}),
+    "계란": (50, 75, 0.5, 6, 5, "clean", {"개": 1, "알": 1}),
+    "계란흰자": (33, 17, 0, 4, 0, "clean", {"개": 1}),
+    "고구마": (150, 195, 45, 2, 0, "clean", {"개": 1}),
+    "감자": (150, 110, 25, 3, 0, "clean", {"개": 1}),
+    "바나나": (120, 105, 27, 1, 0, "clean", {"개": 1}),
+    "사과": (200, 105, 28, 0.5, 0, "clean", {"개": 1}),
+    "방울토마토": (100, 18, 4, 1, 0, "clean", {"개": 0.1, "알": 0.1}),
+    "샐러드": (150, 40, 7, 2, 0.5, "clean", {"접시": 1, "그릇": 1, "팩": 1}),
+    "브로콜리": (100, 34, 7, 3, 0.5, "clean", {}),
+    "두부": (150, 125, 3, 13, 7, "clean", {"모": 2, "팩": 2}),
+    "연어": (100, 200, 0, 20, 13, "clean", {"조각": 1}),
+    "소고기": (150, 330, 0, 39, 19, "clean", {}),
+    "돼지목살": (150, 360, 0, 27, 27, "clean", {}),
+    "삼겹살": (150, 500, 0, 25, 44, "bad_fat", {}),
+    "고등어": (100, 205, 0, 19, 14, "clean", {"토막": 1, "조각": 1}),
+    "참치캔": (100, 150, 1, 20, 7, "processed", {"캔": 1, "개": 1}),
+    "그릭요거트": (100, 95, 5, 9, 4, "clean", {"개": 1, "컵": 1}),
+    "우유": (200, 130, 10, 6, 7, "clean", {"컵": 1, "팩": 1, "ml": 0.005}),
+    "프로틴": (30, 120, 3, 24, 1.5, "substitute", {"스쿱": 1, "포": 1}),
+    "프로틴바": (60, 200, 20, 20, 7, "substitute", {"개": 1}),
+    "프로틴빵": (80, 180, 15, 20, 5, "substitute", {"개": 1}),
+    "오트밀": (40, 150, 27, 5, 3, "clean", {"컵": 1}),
+    "아몬드": (30, 175, 6, 6, 15, "clean", {"줌": 1, "봉": 1}),
+    "김치": (50, 15, 3, 1, 0, "clean", {"접시": 1}),
+    "라면": (120, 500, 79, 10, 16, "refined", {"개": 1, "봉": 1}),
+    "빵": (80, 230, 40, 6, 5, "refined", {"개": 1, "조각": 0.5}),
+    "식빵": (35, 95, 17, 3, 1.5, "refined", {"장": 1, "쪽": 1}),
+    "떡볶이": (300, 480, 100, 10, 5, "refined", {"인분": 1, "그릇": 1}),
+    "떡": (100, 230, 50, 4, 0.5, "refined", {"개": 0.3, "조각": 0.3}),
+    "과자": (60, 320, 38, 4, 17, "refined", {"봉": 1, "봉지": 1}),
+    "아이스크림": (100, 210, 25, 4, 11, "refined", {"개": 1}),
+    "콜라": (355, 150, 39, 0, 0, "refined", {"캔": 1, "잔": 0.7, "ml": 1 / 355}),
+    "제로콜라": (355, 0, 0, 0, 0, "substitute", {"캔": 1, "ml": 1 / 355}),
+    "아메리카노": (350, 10, 2, 1, 0, "clean", {"잔": 1, "컵": 1}),
+    "물": (500, 0, 0, 0, 0, "clean", {"컵": 0.4, "병": 1, "ml": 0.002}),
+    "치킨": (800, 2200, 70, 140, 150, "bad_fat", {"마리": 1, "조각": 0.1}),
+    "돈까스": (200, 600, 45, 25, 35, "bad_fat", {"장": 1, "개": 1}),
+    "튀김": (100, 300, 25, 6, 20, "bad_fat", {"개": 0.3}),
+    "피자": (700, 1900, 220, 80, 80, "bad_fat", {"판": 1, "조각": 0.125}),
+    "햄버거": (230, 550, 45, 25, 30, "bad_fat", {"개": 1}),
+    "김밥": (250, 480, 75, 14, 13, "processed", {"줄": 1}),
+    "비빔밥": (450, 600, 95, 20, 15, "clean", {"그릇": 1}),
+    "제육볶음": (200, 450, 15, 30, 30, "bad_fat", {}),
+    "불고기": (200, 400, 15, 35, 20, "clean", {}),
+    "된장찌개": (400, 150, 12, 12, 6, "clean", {"그릇": 1, "뚝배기": 1}),
+    "김치찌개": (400, 250, 12, 18, 15, "clean", {"그릇": 1}),
+    "국밥": (700, 700, 80, 35, 25, "processed", {"그릇": 1}),
+    "국수": (400, 450, 85, 15, 5, "refined", {"그릇": 1}),
+    "냉면": (600, 550, 105, 18, 5, "refined", {"그릇": 1}),
+    "짜장면": (650, 800, 130, 20, 22, "refined", {"그릇": 1}),
+    "짬뽕": (900, 700, 100, 30, 20, "refined", {"그릇": 1}),
+    "초밥": (25, 45, 8, 2, 0.5, "clean", {"개": 1, "피스": 1, "접시": 2}),
+    "회": (150, 170, 0, 35, 3, "clean", {"접시": 1}),
+    "족발": (300, 800, 5, 70, 55, "bad_fat", {}),
+    "보쌈": (250, 600, 5, 50, 42, "bad_fat", {}),
+}
+
+# 같은 음식의 다른 이름 -> FOODS 키
+ALIASES = {
+    "밥": "쌀밥", "흰밥": "쌀밥", "백미밥": "쌀밥", "공기밥": "쌀밥", "즉석밥": "햇반",
+    "달걀": "계란", "삶은계란": "계란", "구운계란": "계란", "계란후라이": "계란", "흰자": "계란흰자",
+    "닭가슴": "닭가슴살", "소고기스테이크": "소고기", "스테이크": "소고기", "목살": "돼지목살",
+    "단백질쉐이크": "프로틴", "쉐이크": "프로틴", "프로틴쉐이크": "프로틴", "웨이": "프로틴", "보충제": "프로틴",
+    "제로코크": "제로콜라", "제로음료": "제로콜라", "펩시제로": "제로콜라", "사이다": "콜라", "탄산음료": "콜라",
+    "커피": "아메리카노", "요거트": "그릭요거트", "견과류": "아몬드", "토마토": "방울토마토",
+    "후라이드": "치킨", "양념치킨": "치킨", "돈가스": "돈까스", "버거": "햄버거", "우동": "국수", "칼국수": "국수",
+    "순대국": "국밥", "순대국밥": "국밥", "돼지국밥": "국밥", "컵라면": "라면", "쌀국수": "국수", "연어회": "회",
+}
+
+_NAMES = {**{k: k for k in FOODS}, **ALIASES}
+_BY_LEN = sorted(_NAMES, key=len, reverse=True)
+
+# 분수/소수/정수 또는 고유어 수사 + 단위
+_NATIVE = {"한": 1, "하나": 1, "두": 2, "둘": 2, "세": 3, "셋": 3, "네": 4, "넷": 4, "다섯": 5, "반": 0.5, "절반": 0.5}
+_GRAMS = re.compile(r"(\d+(?:\.\d+)?)\s*(kg|g|그램|ml|mL|리터|l)\b")
+_QTY = re.compile(r"(?<![가-힣])(\d+(?:\.\d+)?(?:\s*/\s*\d+)?|절반|반|하나|한|두|둘|세|셋|네|넷|다섯)\s*([가-힣]+)?")
+_HALF_AFTER = re.compile(r"[가-힣]\s*반\b")
+_MITIGATION = re.compile(r"국물\s*(버림|안|x|X|남김)|소스\s*따로|껍질\s*(제거|벗)|기름\s*(제거|뺌)|에어\s*프라이")
+_DELIMS = (",", "+", "＋", "&", " 및 ", " 그리고 ")
+_UNITS = {u for *_, units in FOODS.values() for u in units} | {"g", "kg", "ml", "그램", "인분", "그릇", "공기", "개"}
+# 음식 이름에서 음식표 이름을 뺀 나머지로 허용하는 말 (양/조리법). 이 밖의 말이 남으면 다른 음식으로 보고 매칭하지 않음
+_EXTRA_WORDS = sorted(_UNITS | {
+    "반", "절반", "한", "두", "세", "네", "조금", "약간", "작은", "큰", "대", "중", "소", "정도", "쯤", "만",
+    "삶은", "구운", "찐", "생", "훈제", "데친", "수비드", "에어프라이", "반숙", "완숙", "저지방", "무가당", "플레인", "냉동", "즉석",
+}, key=len, reverse=True)
+_EXTRA = re.compile("(?:" + "|".join(map(re.escape, _EXTRA_WORDS)) + ")*")
+
+def _num(token):
+    if token in _NATIVE: return _NATIVE[token]
+    if "/" in token:
+        a, b = token.split("/")
+        return float(a) / float(b) if float(b) else 1.0
+    return float(token)
+
+# 양 표현 -> (수량, 단위 또는 "g"). 예: "2/3공기" -> (0.667, "공기"), "200g" -> (200, "g"), "1개 반" -> (1.5, "개")
+def parse_amount(text):
+    text = (text or "").strip()
+    m = _GRAMS.search(text)
+    if m:
+        qty, unit = float(m.group(1)), m.group(2).lower()
+        if unit == "kg": qty *= 1000
+        if unit in ("l", "리터"): qty *= 1000
+        return qty, "g" if unit in ("kg", "g", "그램") else "ml"
+    m = _QTY.search(text)
+    if not m: return 1.0, None
+    qty, unit = _num(m.group(1).replace(" ", "")), m.group(2)
+    if unit and unit.endswith("반") and len(unit) > 1: # "1개반"
+        unit, qty = unit[:-1], qty + 0.5
+    elif unit and _HALF_AFTER.search(text[m.end(2) - 1:]):
+        qty += 0.5
+    return qty, unit
+
+# 음식 이름 -> FOODS 키 (정확히 -> 포함된 가장 긴 이름 -> 오타 수준의 글자 유사도) 또는 None
+# 포함 매칭은 나머지가 양/조리법 말뿐일 때만 ("바나나우유", "닭가슴살볶음밥" 은 None -> LLM 이 추정)
+def match_food(name):
+    key = re.sub(r"[\s\d./]+", "", name or "")
+    if not key: return None
+    if key in _NAMES: return _NAMES[key]
+    for alias in _BY_LEN:
+        if len(alias) >= 2 and alias in key and _EXTRA.fullmatch(key.replace(alias, "", 1)): return _NAMES[alias]
+    close = difflib.get_close_matches(key, [n for n in _NAMES if abs(len(n) - len(key)) <= 1], n=1, cutoff=0.75)
+    return _NAMES[close[0]] if close else None
+
+# 괄호 속 메모에 양이 들어 있는지 ("2/3공기", "200g", "반 그릇" 은 양, "국물 버림" 은 아님)
+def _has_amount(text):
+    if re.search(r"\d", text or ""): return True
+    return any(m.group(2) in _UNITS or m.group(1) in ("반", "절반") for m in _QTY.finditer(text or ""))
+
+# 셀 한 칸 -> [(원문, 이름, 양 텍스트)] ("잡곡밥(2/3공기), 닭가슴살(200g)" / "라면 1개 + 밥" / "라면 2/3개 (국물 버림)")
+def split_items(cell):
+    items, depth, cur = [], 0, ""
+    for ch in cell or "":
+        depth += (ch == "(") - (ch == ")")
+        cur += ch
+        delim = next((d for d in _DELIMS if cur.endswith(d)), None) if depth == 0 else None # 괄호 안 쉼표는 양 설명
+        if delim:
+            items.append(cur[:-len(delim)]); cur = ""
+    items.append(cur)
+    out = []
+    for raw in (i.strip() for i in items):
+        if not raw: continue
+        m = re.match(r"^(.*?)\s*\((.*)\)\s*$", raw)
+        text, note = (m.group(1), m.group(2)) if m else (raw, "")
+        name = re.split(r"\s*\d|\s+(?:반|한|두|세|절반)", text)[0]
+        # 괄호에 양이 없으면 (메모일 뿐이면) 이름 뒤에 적힌 양을 씀
+        amount = note if _has_amount(note) or not text[len(name):].strip() else f"{text[len(name):]} {note}".strip()
+        out.append((raw, name.strip() or raw, amount))
+    return out
+
+class Item:
+    def __init__(self, raw, food, servings, mitigated):
+        self.raw = raw
+        self.food = food
+        self.servings = servings
+        self.mitigated = mitigated
+        grams, kcal, carb, protein, fat, self.kind, _ = FOODS[food]
+        self.kcal, self.carb, self.protein, self.fat = (v * servings for v in (kcal, carb, protein, fat))
+
+def estimate_item(raw, name, amount):
+    food = match_food(name)
+    if food is None: return None
+    grams, *_, units = FOODS[food]
+    qty, unit = parse_amount(amount)
+    if unit in ("g", "ml"): servings = qty * units["ml"] if unit == "ml" and "ml" in units else qty / grams
+    else: servings = qty * units.get(unit, 1.0)
+    mitigated = servings < 0.99 or bool(_MITIGATION.search(raw))
+    return Item(raw, food, servings, mitigated)
+
+# ==========================================
+# 하루 추정 + 규칙 채점 (기본 100점)
+# ==========================================
+class DayEstimate:
+    def __init__(self, items, unmatched):
+        self.items = items
+        self.unmatched = unmatched
+        self.kcal = sum(i.kcal for i in items)
+        self.carb = sum(i.carb for i in items)
+        self.protein = sum(i.protein for i in items)
+        self.fat = sum(i.fat for i in items)
+        self.deductions = [] # (설명, 점수)
+        self.score = self._score()
+
+    def _score(self):
+        score = 100
+        if self.protein < 120: self.deductions.append((f"단백질 약 {self.protein:.0f}g으로 부족", -15))
+        elif self.protein < 140: self.deductions.append((f"단백질 약 {self.protein:.0f}g (노력 참작)", -7))
+        for kind, label in (("refined", "정제 탄수화물/당류"), ("bad_fat", "기름진 음식")):
+            hits = [i for i in self.items if i.kind == kind]
+            if not hits: continue
+            # 해당 항목이 모두 양 조절/섭취 방식 개선이면 감점 50%
+            points = -5 if all(i.mitigated for i in hits) else -10
+            self.deductions.append((f"{label}: {', '.join(i.raw for i in hits)}", points))
+        if self.kcal > 2100: self.deductions.append((f"과식 (약 {self.kcal:.0f}kcal)", -10))
+        score += sum(p for _, p in self.deductions)
+        if self.items and all(i.kind == "clean" or i.food == "프로틴" for i in self.items): # 보충제 프로틴은 허용
+            self.deductions.append(("자연식 위주 구성", 5))
+            score += 5
+        return max(0, min(100, score))
+
+    @property
+    def complete(self):
+        return bool(self.items) and not self.unmatched
+
+    def total_text(self):
+        return f"약 {self.kcal:.0f}kcal (탄:{self.carb:.0f}g, 단:{self.protein:.0f}g, 지:{self.fat:.0f}g)"
+
+    # LLM 없이 만드는 정중한 요약 코멘트
+    def comment(self):
+        minus = [f"{d}({p}점)" for d, p in self.deductions if p < 0]
+        plus = [d for d, p in self.deductions if p > 0]
+        lines = [f"추정 단백질 {self.protein:.0f}g, 총 {self.kcal:.0f}kcal입니다."]
+        if minus: lines.append("감점 요인: " + "; ".join(minus) + ".")
+        else: lines.append("감점 요인 없이 목표에 맞게 잘 드셨습니다.")
+        if plus: lines.append(f"{plus[0]}으로 가산점이 반영되었습니다.")
+        return " ".join(lines)
+
+# meals: [아침, 점심, 간식, 저녁, 보충제] 셀 텍스트
+def estimate_day(meals):
+    items, unmatched = [], []
+    for cell in meals:
+        for raw, name, amount in split_items(cell):
+            item = estimate_item(raw, name, amount)
+            if item: items.append(item)
+            else: unmatched.append(raw)
+    return DayEstimate(items, unmatched)
@@ -2,33 +2,144 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import datetime
+import re
+import numpy as np
 import google.generativeai as genai
+import llm
+import workout
+
+# 주간 집계 대상 운동 시트
+WORKOUT_SHEETS = workout.ALL_SHEETS
+
+# 식단 total 열 예: "약 1800kcal (탄:150g, 단:160g, 지:50g)"
+_KCAL = re.compile(r"(\d+(?:\.\d+)?)\s*kcal", re.I)
+_MACRO = re.compile(r"(탄수화물|단백질|지방|탄|단|지)\s*[:：]?\s*(\d+(?:\.\d+)?)")
+_MACRO_KEYS = {"탄": "carb", "단": "protein", "지": "fat"}
+
+def parse_date(text):
+    try: return datetime.date.fromisoformat(text.strip()[:10])
+    except (ValueError, AttributeError): return None
+
+# total 열 -> {"kcal", "carb", "protein", "fat"} (못 읽은 항목은 빠짐)
+def parse_macros(text):
+    out = {}
+    m = _KCAL.search(text or "")
+    if m: out["kcal"] = float(m.group(1))
+    for key, val in _MACRO.findall(text or ""): out[_MACRO_KEYS[key[0]]] = float(val)
+    return out
+
+def _avg(values):
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), 1) if values else None
+
+# ==========================================
+# 주간 집계 (LLM 없이 재사용 가능) - 운동은 열 저장소(db.workout_store())에서, 식단은 시트 1회 읽기
+# ==========================================
+def weekly_summary(db, end=None, days=7):
+    end = end or datetime.date.today()
+    start = end - datetime.timedelta(days=days - 1)
+    prev_start = start - datetime.timedelta(days=days)
+    summary = {"start": start.isoformat(), "end": end.isoformat(), "workout": {}, "prs": [], "diet": {}}
+
+    # 이번 주 / 지난주 / 그 이전(1RM 최고 기록 비교용)으로 나눠 부위별 집계
+    cols, sheets, exercises = db.workout_store().window(None, end)
+    date, e1rm = cols["date"], cols["e1rm"]
+    cur, prev = date >= start.toordinal(), (date < start.toordinal()) & (date >= prev_start.toordinal())
+    for sheet_id, sheet in enumerate(sheets):
+        if sheet not in WORKOUT_SHEETS: continue
+        mine = cols["sheet"] == sheet_id
+        now, prev_volume = mine & cur, cols["volume"][mine & prev].sum()
+        if now.any() or prev_volume:
+            summary["workout"][sheet] = {
+                "sessions": len(np.unique(date[now])), "sets": int(np.nan_to_num(cols["sets"][now], nan=1.0).sum()), # 세트 미기재 -> 1세트
+                "volume": int(cols["volume"][now].sum()), "prev_volume": int(prev_volume)}
+        week = now & np.isfinite(e1rm)
+        for ex in dict.fromkeys(cols["exercise"][week].tolist()): # 이번 주 처음 나온 순서
+            rows = np.flatnonzero(week & (cols["exercise"] == ex))
+            best = rows[np.argmax(e1rm[rows])]
+            before = e1rm[mine & ~cur & (cols["exercise"] == ex)]
+            prev_best = float(np.nanmax(before)) if np.isfinite(before).any() else None
+            if prev_best is None or e1rm[best] > prev_best:
+                summary["prs"].append({"sheet": sheet, "exercise": exercises[ex], "e1rm": round(float(e1rm[best]), 1),
+                                       "prev_best": round(prev_best, 1) if prev_best else None,
+                                       "date": datetime.date.fromordinal(int(date[best])).isoformat()})
+
+    summary["diet"] = _diet_summary(db, start, end, prev_start)
+    return summary
+
+# 식단: 기록 일수, 평균 점수, 일별/평균 영양소 (지난주 평균과 비교)
+def _diet_summary(db, start, end, prev_start):
+    try: rows = db.get_all_values("식단")
+    except Exception: return {}
+    cur, prev = [], []
+    for row in rows[1:]:
+        day = parse_date(row[0]) if row else None
+        if day is None or day > end or day < prev_start: continue
+        row = row + [""] * (9 - len(row))
+        score = workout.parse_column([row[7]])[0]
+        entry = {"date": day.isoformat(), "score": float(score) if score == score else None, **parse_macros(row[6])}
+        (cur if day >= start else prev).append(entry)
+    if not cur and not prev: return {}
+    cur.sort(key=lambda e: e["date"])
+    keys = ("kcal", "carb", "protein", "fat")
+    return {
+        "days_logged": len(cur),
+        "avg_score": _avg([e["score"] for e in cur]),
+        "prev_avg_score": _avg([e["score"] for e in prev]),
+        "macros_avg": {k: _avg([e.get(k) for e in cur]) for k in keys},
+        "macros_prev_avg": {k: _avg([e.get(k) for e in prev]) for k in keys},
+        "daily": [[e["date"][5:]] + [e.get(k) for k in keys] for e in cur],
+    }
+
+def _fmt(x):
+    return "-" if x is None else (f"{x:g}" if isinstance(x, float) else str(x))
+
+# 집계 결과 -> 프롬프트/화면용 짧은 텍스트
+def format_summary(summary):
+    lines = [f"기간: {summary['start']} ~ {summary['end']}", "[운동] 부위: 운동일/세트/볼륨(kg, 지난주)"]
+    for sheet, w in summary["workout"].items():
+        lines.append(f"- {sheet}: {w['sessions']}일/{w['sets']}세트/{w['volume']} ({w['prev_volume']})")
+    if not summary["workout"]: lines.append("- 기록 없음")
+    lines.append("[1RM 신기록] 종목: 추정 1RM (이전 최고)")
+    for pr in summary["prs"]:
+        lines.append(f"- {pr['exercise']}({pr['sheet']}): {pr['e1rm']}kg ({_fmt(pr['prev_best'])}) {pr['date'][5:]}")
+    if not summary["prs"]: lines.append("- 없음")
+    d = summary["diet"]
+    if d:
+        avg, prev = d["macros_avg"], d["macros_prev_avg"]
+        lines.append(f"[식단] 기록 {d['days_logged']}일, 평균 점수 {_fmt(d['avg_score'])} (지난주 {_fmt(d['prev_avg_score'])})")
+        lines.append("평균 kcal/탄/단/지: " + "/".join(_fmt(avg[k]) for k in avg) + " (지난주 " + "/".join(_fmt(prev[k]) for k in prev) + ")")
+        lines.append("일별 kcal/탄/단/지: " + ", ".join(f"{r[0]} " + "/".join(_fmt(v) for v in r[1:]) for r in d["daily"]))
+    else:
+        lines.append("[식단] 기록 없음")
+    return "\n".join(lines)
 
 def send_weekly_report(db, email_id, email_pw, model_name="gemini-2.5-flash"):
     if not email_id: return "이메일 설정이 필요합니다."
-    
+
     try:
-        logs = db.get_all_values("통합로그")[-7:]
-        diet = db.get_all_values("식단")[-7:]
-        
+        # 원본 행 대신 로컬 집계 요약만 전송 (프롬프트 토큰/생성 시간 절감)
+        summary_text = format_summary(weekly_summary(db))
+
         model = genai.GenerativeModel(model_name)
         prompt = f"""
         자비스, 주간 리포트를 작성하세요.
-        [데이터]: 운동로그({logs}), 식단({diet})
+        [주간 집계]
+        {summary_text}
         [형식]: 정중한 이메일 포맷. 성과 요약, 칭찬, 조언 포함.
         """
-        res = model.generate_content(prompt)
-        
+        report_text = llm.generate(model, prompt) # 같은 주간 데이터면 캐시 재사용
+
         msg = MIMEMultipart()
         msg['From'] = email_id
         msg['To'] = email_id
         msg['Subject'] = f"[Jarvis] 주간 리포트 ({datetime.datetime.now().strftime('%Y-%m-%d')})"
-        msg.attach(MIMEText(res.text, 'plain'))
-        
+        msg.attach(MIMEText(report_text, 'plain'))
+
         s = smtplib.SMTP('smtp.gmail.com', 587)
         s.starttls()
         s.login(email_id, email_pw)
         s.sendmail(email_id, email_id, msg.as_string())
         s.quit()
         return "📧 주간 리포트 발송 완료"
-    except Exception as e: return f"발송 실패: {e}"
\ No newline at end of file
+    except Exception as e: return f"발송 실패: {e}"
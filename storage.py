@@ -0,0 +1,417 @@
+import json
+import sqlite3
+import threading
+import time
+from gspread.utils import rowcol_to_a1
+import metrics
+
+def range_a1(row, col, values):
+    return f"{rowcol_to_a1(row, col)}:{rowcol_to_a1(row + len(values) - 1, col + max(len(v) for v in values) - 1)}"
+
+def _cell(rows, row, col):
+    try: return rows[row-1][col-1]
+    except IndexError: return ""
+
+def _norm(row):
+    row = ["" if v is None else str(v) for v in row]
+    while row and row[-1] == "": row.pop()
+    return row
+
+# {row: values} 형태의 일부 행에 셀 쓰기
+def _set_cell_row(rows, row, col, val):
+    values = rows.setdefault(row, [])
+    while len(values) < col: values.append("")
+    values[col-1] = "" if val is None else str(val)
+
+def _set_cell(rows, row, col, val):
+    while len(rows) < row: rows.append([])
+    while len(rows[row-1]) < col: rows[row-1].append("")
+    rows[row-1][col-1] = "" if val is None else str(val)
+
+# ==========================================
+# 저장소 인터페이스: 시트 단위 읽기 + 쓰기 묶음(apply) 1회 반영
+# cells: {(row, col): val}, ranges: [(시작 row, 시작 col, 2차원 values)], rows: 끝에 추가할 행 목록
+# ==========================================
+class StorageBackend:
+    def get_all_values(self, sheet_name):
+        raise NotImplementedError
+
+    # (헤더 행, start_row부터 끝까지의 행) - 기본 구현은 전체 읽기 후 자르기
+    def get_rows(self, sheet_name, start_row):
+        rows = self.get_all_values(sheet_name)
+        return (rows[0] if rows else []), rows[start_row-1:]
+
+    def apply(self, sheet_name, cells=None, ranges=None, rows=None):
+        raise NotImplementedError
+
+    def ensure_sheet(self, sheet_name, header):
+        raise NotImplementedError
+
+# 구글 시트 직접 연결 (doc: gspread Spreadsheet 또는 같은 인터페이스의 가짜 객체)
+# 모든 API 호출은 metrics 로 계측 (지연/오류/429 집계 + 분당 한도 근처에서 자동 대기)
+class SheetsBackend(StorageBackend):
+    def __init__(self, doc):
+        self.doc = doc
+        self._ws_cache = {} # 시트 이름 -> worksheet 핸들 (doc.worksheet() 왕복 절약)
+
+    def worksheet(self, sheet_name):
+        ws = self._ws_cache.get(sheet_name)
+        if ws is None:
+            ws = self._ws_cache[sheet_name] = metrics.call("sheets", "worksheet", self.doc.worksheet, sheet_name)
+        return ws
+
+    def get_all_values(self, sheet_name):
+        ws = self.worksheet(sheet_name)
+        return metrics.call("sheets", "get_all_values", ws.get_all_values)
+
+    # 헤더 + 꼬리 구간만 batch_get 1회로 읽기 (열 범위는 시트 격자 크기 기준, 행은 끝까지)
+    def get_rows(self, sheet_name, start_row):
+        ws = self.worksheet(sheet_name)
+        last_col = rowcol_to_a1(1, ws.col_count)[:-1]
+        header, tail = metrics.call("sheets", "batch_get", ws.batch_get, [f"A1:{last_col}1", f"A{start_row}:{last_col}"])
+        return (list(header[0]) if header else []), [list(r) for r in tail]
+
+    # 행 추가 1회 + batch_update 1회 (추가를 먼저 해야 새 행에 대한 셀 쓰기가 올바른 위치에 들어감)
+    # 추가 행은 RAW (기존 append_row 와 같음 - 날짜 등이 시트에서 변환되지 않아야 find_row/재시도 중복 검사가 문자열로 맞음)
+    def apply(self, sheet_name, cells=None, ranges=None, rows=None):
+        ws = self.worksheet(sheet_name)
+        if rows:
+            metrics.call("sheets", "append_rows", ws.append_rows, rows, value_input_option="RAW")
+        data = [{"range": range_a1(r, c, values), "values": values} for r, c, values in ranges or []]
+        data += [{"range": rowcol_to_a1(r, c), "values": [[v]]} for (r, c), v in sorted((cells or {}).items())]
+        if data:
+            metrics.call("sheets", "batch_update", ws.batch_update, data, value_input_option="USER_ENTERED")
+
+    def ensure_sheet(self, sheet_name, header):
+        try: return self.worksheet(sheet_name)
+        except:
+            ws = self._ws_cache[sheet_name] = metrics.call("sheets", "add_worksheet", self.doc.add_worksheet, sheet_name, 100, len(header))
+            metrics.call("sheets", "append_row", ws.append_row, header)
+            return ws
+
+# ==========================================
+# 로컬 SQLite(WAL) 저장소: 읽기/쓰기는 로컬에서 즉시 처리, 변경분은 outbox에 쌓아 Syncer가 시트로 복제
+# ==========================================
+class LocalBackend(StorageBackend):
+    def __init__(self, path, remote=None, refresh_after=600, retry_after=30):
+        self.remote = remote
+        self.refresh_after = refresh_after # 대기 중 변경이 없을 때 Syncer 가 원격 스냅샷을 다시 받는 주기(초)
+        self.retry_after = retry_after     # 처음 받기에 실패한 시트는 이 시간(초) 동안 다시 시도하지 않고 바로 실패
+        self.on_write = None               # 쓰기 발생 시 호출 (Syncer 깨우기)
+        self.on_stale = None               # 로컬 사본을 원격으로 교체했을 때 시트 이름으로 호출 (핸들러 캐시 폐기)
+        self._pull_failed = {}             # 시트 이름 -> 처음 받기 실패 시각
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sheet_rows (sheet TEXT, row INTEGER, data TEXT, PRIMARY KEY (sheet, row));
+            CREATE TABLE IF NOT EXISTS sheets (name TEXT PRIMARY KEY, pulled_at REAL);
+            CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, sheet TEXT, op TEXT, created REAL);
+            CREATE TABLE IF NOT EXISTS conflicts (id INTEGER PRIMARY KEY AUTOINCREMENT, sheet TEXT, detail TEXT, detected REAL);
+            CREATE TABLE IF NOT EXISTS row_map (sheet TEXT, local_row INTEGER, remote_row INTEGER, PRIMARY KEY (sheet, local_row));
+        """)
+        self.conn.commit()
+
+    def _known(self, sheet_name):
+        return self.conn.execute("SELECT 1 FROM sheets WHERE name = ?", (sheet_name,)).fetchone() is not None
+
+    def _load(self, sheet_name):
+        rows = []
+        for row, data in self.conn.execute("SELECT row, data FROM sheet_rows WHERE sheet = ? ORDER BY row", (sheet_name,)):
+            while len(rows) < row - 1: rows.append([])
+            rows.append(json.loads(data))
+        return rows
+
+    # 지정한 행만 읽기 -> {row: values}
+    def _load_rows(self, sheet_name, row_nums):
+        row_nums, out = sorted(row_nums), {}
+        for i in range(0, len(row_nums), 500):
+            chunk = row_nums[i:i+500]
+            query = f"SELECT row, data FROM sheet_rows WHERE sheet = ? AND row IN ({', '.join('?' * len(chunk))})"
+            out.update((row, json.loads(data)) for row, data in self.conn.execute(query, (sheet_name, *chunk)))
+        return out
+
+    # 원격 시트 전체를 받아 로컬 사본 교체 (원격 읽기는 잠금 밖에서 - 그동안 로컬 쓰기를 막지 않음)
+    def pull(self, sheet_name):
+        return self.replace(sheet_name, self.remote.get_all_values(sheet_name))
+
+    # 아직 시트로 보내지 않은 쓰기가 있으면 교체하지 않음 (False) - 로컬 변경이 사라지지 않도록
+    def replace(self, sheet_name, rows):
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM outbox WHERE sheet = ? LIMIT 1", (sheet_name,)).fetchone(): return False
+            with self.conn:
+                self.conn.execute("DELETE FROM sheet_rows WHERE sheet = ?", (sheet_name,))
+                self.conn.executemany("INSERT INTO sheet_rows VALUES (?, ?, ?)",
+                                      [(sheet_name, i, json.dumps(r, ensure_ascii=False)) for i, r in enumerate(rows, start=1)])
+                self.conn.execute("INSERT OR REPLACE INTO sheets VALUES (?, ?)", (sheet_name, time.time()))
+                self.conn.execute("DELETE FROM row_map WHERE sheet = ?", (sheet_name,)) # 이제 로컬 행 번호 = 원격 행 번호
+        if self.on_stale: self.on_stale(sheet_name)
+        return True
+
+    # 로컬 사본에서만 읽음. 원격은 처음 쓰는 시트일 때만 받고, 이후 갱신은 Syncer 가 백그라운드에서 (쓰기 경로는 시트를 기다리지 않음)
+    def get_all_values(self, sheet_name):
+        with self.lock:
+            known = self._known(sheet_name)
+        if not known:
+            if self.remote is None: raise KeyError(sheet_name)
+            failed = self._pull_failed.get(sheet_name)
+            if failed and time.time() - failed < self.retry_after: raise KeyError(sheet_name) # 로컬 사본도 없고 연결도 안 됨
+            try: self.pull(sheet_name)
+            except:
+                self._pull_failed[sheet_name] = time.time()
+                raise
+            self._pull_failed.pop(sheet_name, None)
+        with self.lock:
+            return self._load(sheet_name)
+
+    # 바뀌는 행과 마지막 행 번호만 읽어 반영 (시트 전체를 다시 읽지 않음)
+    def apply(self, sheet_name, cells=None, ranges=None, rows=None):
+        if not self._known(sheet_name): self.get_all_values(sheet_name)
+        with self.lock:
+            last = self.conn.execute("SELECT COALESCE(MAX(row), 0) FROM sheet_rows WHERE sheet = ?", (sheet_name,)).fetchone()[0]
+            touched = {r + i for r, _, values in ranges or [] for i in range(len(values))} | {r for r, _ in cells or {}}
+            current = self._load_rows(sheet_name, touched)
+            op = {"cells": [], "ranges": [], "rows": None}
+            if rows:
+                op["rows"] = [last + 1, [["" if v is None else str(v) for v in r] for r in rows]]
+                for i, r in enumerate(op["rows"][1]): current[last + 1 + i] = list(r)
+            for r, c, values in ranges or []:
+                op["ranges"].append([r, c, values])
+                for i, vals in enumerate(values):
+                    for j, v in enumerate(vals): _set_cell_row(current, r + i, c + j, v)
+            for (r, c), v in sorted((cells or {}).items()):
+                op["cells"].append([r, c, v, _cell([current.get(r, [])], 1, c)]) # 마지막 값은 충돌 감지용 기준값
+                _set_cell_row(current, r, c, v)
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO sheet_rows VALUES (?, ?, ?)",
+                                      [(sheet_name, r, json.dumps(values, ensure_ascii=False)) for r, values in sorted(current.items())])
+                self.conn.execute("INSERT INTO outbox (sheet, op, created) VALUES (?, ?, ?)",
+                                  (sheet_name, json.dumps(op, ensure_ascii=False), time.time()))
+        if self.on_write: self.on_write()
+
+    def ensure_sheet(self, sheet_name, header):
+        with self.lock:
+            try: return self.get_all_values(sheet_name)
+            except:
+                if self.remote: self.remote.ensure_sheet(sheet_name, header); self.pull(sheet_name)
+                else:
+                    with self.conn: self.conn.execute("INSERT OR REPLACE INTO sheets VALUES (?, NULL)", (sheet_name,))
+                    self.apply(sheet_name, rows=[header])
+
+    # Syncer 가 다시 받을 시트: 충돌로 표시됐거나 refresh_after 가 지났고, 보내지 않은 쓰기가 없는 것
+    def stale_sheets(self):
+        with self.lock:
+            return [name for (name,) in self.conn.execute(
+                "SELECT name FROM sheets WHERE pulled_at IS NOT NULL AND pulled_at < ? AND name NOT IN (SELECT sheet FROM outbox)",
+                (time.time() - self.refresh_after,))]
+
+    # --- Syncer용 ---
+    # exclude: 대기 중인(실패한) 시트 - 그 시트의 작업이 많아도 다른 시트 작업이 밀리지 않도록
+    def pending_ops(self, limit=500, exclude=()):
+        exclude = list(exclude)
+        with self.lock:
+            return [(i, s, json.loads(op)) for i, s, op in self.conn.execute(
+                f"SELECT id, sheet, op FROM outbox WHERE sheet NOT IN ({', '.join('?' * len(exclude))}) ORDER BY id LIMIT ?",
+                (*exclude, limit))]
+
+    def ack(self, op_ids):
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in op_ids])
+
+    # 행 어긋남 이후 로컬에서 추가한 행의 실제 원격 위치 {로컬 행: 원격 행} (로컬 사본을 다시 받을 때까지 유지)
+    def row_map(self, sheet_name):
+        with self.lock:
+            return dict(self.conn.execute("SELECT local_row, remote_row FROM row_map WHERE sheet = ?", (sheet_name,)))
+
+    def save_row_map(self, sheet_name, mapping):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO row_map VALUES (?, ?, ?)", [(sheet_name, l, r) for l, r in mapping.items()])
+
+    def record_conflict(self, sheet_name, detail):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO conflicts (sheet, detail, detected) VALUES (?, ?, ?)",
+                              (sheet_name, json.dumps(detail, ensure_ascii=False), time.time()))
+
+    # 다음 Syncer 주기에 원격에서 다시 받도록 표시
+    def mark_stale(self, sheet_name):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE sheets SET pulled_at = 0 WHERE name = ?", (sheet_name,))
+
+    def status(self):
+        with self.lock:
+            return {
+                "pending": self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0],
+                "conflicts": self.conn.execute("SELECT COUNT(*) FROM conflicts").fetchone()[0],
+            }
+
+# ==========================================
+# 백그라운드 동기화: outbox를 시트별로 묶어 원격에 반영 (실패하면 outbox가 남아 다음 주기/재시작 후 이어서 진행)
+# ==========================================
+class Syncer:
+    def __init__(self, local, remote, interval=2.0, max_backoff=60.0):
+        self.local = local
+        self.remote = remote
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.last_sync = None
+        self.last_error = None
+        self.sheet_errors = {} # 시트 이름 -> {"error", "retry_at", "backoff"} (실패한 시트만 따로 대기, 나머지는 계속 동기화)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        local.on_write = self._wake.set
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="sheets-syncer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        backoff = self.interval
+        while not self._stop.is_set():
+            self._wake.wait(backoff)
+            self._wake.clear()
+            try:
+                while self.sync_once(): pass
+                self.refresh()
+                backoff = self.interval
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                backoff = min(backoff * 2, self.max_backoff) # 쿼터 초과/오프라인이면 점점 느리게 재시도
+
+    def _due(self, sheet):
+        info = self.sheet_errors.get(sheet)
+        return info is None or time.time() >= info["retry_at"]
+
+    def _sheet_failed(self, sheet, e):
+        backoff = min(self.sheet_errors.get(sheet, {}).get("backoff", self.interval / 2) * 2, self.max_backoff)
+        self.sheet_errors[sheet] = {"error": f"{type(e).__name__}: {e}", "retry_at": time.time() + backoff, "backoff": backoff}
+
+    # 오래됐거나 충돌로 표시된 시트를 원격에서 다시 받아 로컬 사본 교체 (실패한 시트는 시트별 대기 후 재시도)
+    def refresh(self):
+        refreshed = 0
+        for sheet in self.local.stale_sheets():
+            if not self._due(sheet): continue
+            try: refreshed += bool(self.local.pull(sheet))
+            except Exception as e:
+                self._sheet_failed(sheet, e)
+                continue
+            self.sheet_errors.pop(sheet, None)
+        return refreshed
+
+    # 한 주기 처리. 반영한 작업 수 반환. 시트별로 따로 처리해 한 시트의 실패(삭제/이름 변경 등)가 다른 시트를 막지 않음
+    # 시도한 시트가 모두 실패한 경우에만 예외 (전체 재시도 간격을 늘림)
+    def sync_once(self):
+        ops = self.local.pending_ops(exclude=[s for s in self.sheet_errors if not self._due(s)])
+        if not ops: return 0
+        by_sheet = {}
+        for op_id, sheet, op in ops:
+            by_sheet.setdefault(sheet, []).append((op_id, op))
+
+        synced, error = 0, None
+        for sheet, entries in by_sheet.items():
+            try: self._sync_sheet(sheet, entries)
+            except Exception as e:
+                self._sheet_failed(sheet, e)
+                error = e
+                continue
+            self.sheet_errors.pop(sheet, None)
+            synced += len(entries)
+        if not synced: raise error
+        self.last_sync = time.time()
+        self.last_error = None
+        return synced
+
+    def _sync_sheet(self, sheet, entries):
+        # 원격 현재값을 기준으로 로컬 쓰기 순서를 재현하며 충돌 검사
+        baseline = self.remote.get_all_values(sheet)
+        cells, ranges, rows, conflicts = {}, [], [], []
+        # 행 어긋남으로 다른 위치에 추가된 로컬 행 -> 원격 행. 이후 그 행에 대한 셀/범위 쓰기는 원격 위치로 옮겨 씀
+        row_map = self.local.row_map(sheet)
+        saved_map = dict(row_map)
+        for op_id, op in entries:
+            if op["rows"]:
+                start, new_rows = op["rows"]
+                expected, n = row_map.get(start, start), len(new_rows)
+                new_norm = [_norm(r) for r in new_rows]
+                # 이전 주기에 행 추가까지 반영된 뒤 실패한 작업이면 다시 추가하지 않음 (재개 시 중복 방지, 어긋났다면 예상 위치 뒤쪽에 있음)
+                actual = next((p for p in range(expected, len(baseline) - n + 2)
+                               if [_norm(r) for r in baseline[p-1:p-1+n]] == new_norm), None)
+                if actual is None:
+                    actual = len(baseline) + 1
+                    if actual != expected:
+                        # 다른 곳에서 행이 추가/삭제됨 -> 새 행 위치가 로컬과 달라짐
+                        conflicts.append({"type": "row_drift", "expected": start, "actual": actual})
+                    baseline.extend([list(r) for r in new_rows])
+                    rows.extend(new_rows)
+                row_map.update((start + i, actual + i) for i in range(n) if start != actual)
+            # 범위 쓰기(볼륨/1RM 등 계산값)는 재계산 가능한 파생 데이터라 마지막 쓰기 우선
+            for r, c, values in op["ranges"]:
+                if any(r + i in row_map for i in range(len(values))):
+                    parts = [(row_map.get(r + i, r + i), c, [vals]) for i, vals in enumerate(values)]
+                else: parts = [(r, c, values)]
+                for r0, c0, vals2d in parts:
+                    ranges.append((r0, c0, vals2d))
+                    for i, vals in enumerate(vals2d):
+                        for j, v in enumerate(vals): _set_cell(baseline, r0 + i, c0 + j, v)
+            for r, c, v, base in op["cells"]:
+                r = row_map.get(r, r)
+                remote_val = _cell(baseline, r, c)
+                if remote_val != base and remote_val != str(v):
+                    # 원격에서 같은 셀이 바뀜 -> 덮어쓰지 않고 기록 후 원격값으로 로컬 갱신
+                    conflicts.append({"type": "cell", "row": r, "col": c, "local": v, "base": base, "remote": remote_val})
+                    continue
+                cells[(r, c)] = v
+                _set_cell(baseline, r, c, v)
+        self.remote.apply(sheet, cells=cells, ranges=ranges, rows=rows)
+        if row_map != saved_map: self.local.save_row_map(sheet, row_map)
+        self.local.ack([op_id for op_id, _ in entries])
+        # 충돌은 반영 성공 후에만 기록 (실패 후 재시도 때 중복 기록 방지). 로컬 사본은 이어지는 refresh 에서 원격으로 교체
+        # (행 어긋남 포함 - 교체 시 핸들러의 스냅샷/행 인덱스도 폐기되어 다음 쓰기가 원격 값을 기준으로 함)
+        for detail in conflicts: self.local.record_conflict(sheet, detail)
+        if conflicts: self.local.mark_stale(sheet)
+
+    def status(self):
+        return dict(self.local.status(), last_sync=self.last_sync, last_error=self.last_error,
+                    sheet_errors={sheet: info["error"] for sheet, info in self.sheet_errors.items()},
+                    running=bool(self._thread and self._thread.is_alive()))
+
+# 작업 상태(워터마크/체크포인트 등) 키-값 저장소 - 값은 JSON
+class StateStore:
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def get(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value, ensure_ascii=False)))
+
+    def delete(self, key):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+
+# 같은 로컬 파일에는 엔진(LocalBackend + Syncer) 하나만 (Streamlit 재실행마다 스레드가 늘지 않도록)
+_engines = {}
+_engines_lock = threading.Lock()
+
+def open_local(path, remote=None, sync=True):
+    with _engines_lock:
+        local, syncer = _engines.get(path) or (LocalBackend(path, remote), None)
+        if remote and local.remote is None: local.remote = remote
+        if syncer is None and local.remote and sync: syncer = Syncer(local, local.remote)
+        _engines[path] = (local, syncer)
+        if syncer: syncer.start()
+        return local, syncer
@@ -0,0 +1,16 @@
+import os
+import sys
+import pytest
+
+# 저장소 루트의 모듈(database, storage ...)을 그대로 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+# 가짜 시트에는 분당 한도가 없으므로 시트 스로틀은 끄고, 테스트마다 계측값을 비움
+@pytest.fixture(autouse=True)
+def no_sheets_throttle():
+    saved = metrics.registry.throttles.pop("sheets", None)
+    metrics.registry.reset()
+    yield
+    if saved: metrics.registry.throttles["sheets"] = saved
@@ -0,0 +1,68 @@
+import database
+import fakes
+
+HEADER = ["날짜", "아침", "점심", "간식", "저녁"]
+
+def make_db(max_buffer=100):
+    client = fakes.FakeClient({"식단": [HEADER, ["2026-01-01", "", "", "", ""]], "등": [["날짜", "종목"]]})
+    db = database.DBHandler(client=client, max_buffer=max_buffer)
+    client.api.reset() # 연결 과정 호출은 제외
+    return db, client
+
+def test_direct_writes_call_api_each_time():
+    db, client = make_db()
+    db.update_cell("식단", 2, 2, "밥")
+    db.update_cell("식단", 2, 3, "국")
+    assert client.api.calls["batch_update"] == 2
+
+def test_batch_flushes_once_per_sheet_on_exit():
+    db, client = make_db()
+    with db.batch():
+        for col in range(2, 6): db.update_cell("식단", 2, col, f"메뉴{col}")
+        db.append_row("식단", ["2026-01-02", "죽"])
+        db.append_row("등", ["2026-01-02", "데드리프트"])
+        assert sum(client.api.calls.values()) == 0
+        assert db.pending_count() == 6
+    assert client.api.calls["batch_update"] == 1
+    assert client.api.calls["append_rows"] == 2
+    assert db.pending_count() == 0
+    rows = client.doc.sheets["식단"].rows
+    assert rows[1] == ["2026-01-01", "메뉴2", "메뉴3", "메뉴4", "메뉴5"]
+    assert rows[2] == ["2026-01-02", "죽"]
+
+def test_batch_flushes_sheet_when_max_buffer_reached():
+    db, client = make_db(max_buffer=3)
+    with db.batch():
+        for col in range(2, 5): db.update_cell("식단", 2, col, "x")
+        assert client.api.calls["batch_update"] == 1 # 3번째 쓰기에서 그 시트만 반영
+        db.update_cell("식단", 2, 5, "y")
+        db.append_row("등", ["2026-01-02", "렛풀다운"])
+        assert client.api.calls["batch_update"] == 1
+        assert client.api.calls["append_rows"] == 0
+    assert client.api.calls["batch_update"] == 2
+    assert client.api.calls["append_rows"] == 1
+
+def test_read_inside_batch_sees_pending_writes():
+    db, client = make_db()
+    with db.batch():
+        db.update_cell("식단", 2, 2, "밥")
+        assert db.get_cell_value("식단", 2, 2) == "밥"
+        assert db.get_all_values("식단")[1][1] == "밥" # 캐시가 없으면 먼저 반영 후 읽기
+        assert client.api.calls["batch_update"] == 1
+
+def test_snapshot_cache_avoids_repeat_reads():
+    db, client = make_db()
+    db.get_all_values("식단")
+    db.update_cell("식단", 2, 2, "밥")
+    assert db.get_all_values("식단")[1][1] == "밥"
+    assert client.api.calls["get_all_values"] == 1
+
+def test_appended_rows_are_sent_raw():
+    db, client = make_db()
+    ws = client.doc.sheets["식단"]
+    sent = []
+    append_rows = ws.append_rows
+    ws.append_rows = lambda rows, **kwargs: sent.append(kwargs) or append_rows(rows, **kwargs)
+    db.append_row("식단", ["2026-01-02", "1/2공기"])
+    assert sent == [{"value_input_option": "RAW"}]
+    assert db.find_row("식단", "2026-01-02")[1][:2] == ["2026-01-02", "1/2공기"]
@@ -0,0 +1,76 @@
+import json
+import pytest
+import google.generativeai as genai
+import database
+import diet
+import fakes
+import llm
+
+HEADER = ["날짜", "아침", "점심", "간식", "저녁", "보충제", "총합", "점수", "코멘트"]
+
+def day(date, lunch="마라탕"):
+    return [date, "", lunch, "", "", "", "", "", ""]
+
+def fake_call(model=None):
+    model = model or fakes.FakeModel()
+    return lambda prompt: llm.generate(model, prompt, use_cache=False)
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm, "_cache", llm.ResponseCache(str(tmp_path / "cache.sqlite")))
+    fakes.FakeModel.reset(latency=0.0)
+
+def test_score_chunk_reads_every_day_from_array_reply():
+    rows = [day("2026-01-01"), day("2026-01-02")]
+    scored = diet._score_chunk(fake_call(), rows)
+    assert set(scored) == {"2026-01-01", "2026-01-02"}
+    assert scored["2026-01-01"][1] == "85"
+
+def test_score_chunk_drops_missing_and_malformed_days():
+    rows = [day("2026-01-01"), day("2026-01-02"), day("2026-01-03")]
+    reply = json.dumps([
+        {"date": "2026-01-01", "total": "약 1800kcal", "score": "80", "comment": "좋습니다."},
+        {"date": "2026-01-02", "total": "약 1800kcal", "score": "", "comment": "점수 없음"},
+        {"date": "2099-12-31", "total": "약 1800kcal", "score": "90", "comment": "없는 날짜"},
+    ])
+    assert diet._score_chunk(lambda prompt: reply, rows) == {"2026-01-01": ("약 1800kcal", "80", "좋습니다.")}
+
+def test_score_chunk_returns_nothing_for_non_json_reply():
+    rows = [day("2026-01-01"), day("2026-01-02")]
+    assert diet._score_chunk(lambda prompt: "죄송합니다. 분석할 수 없습니다.", rows) == {}
+    assert diet._score_chunk(lambda prompt: '{"date": "2026-01-01"}', rows) == {} # 배열이 아님
+
+def test_score_chunk_single_day_uses_object_prompt():
+    scored = diet._score_chunk(fake_call(), [day("2026-01-01")])
+    assert scored == {"2026-01-01": ("약 1800kcal (탄:150g, 단:160g, 지:50g)", "85", "단백질 섭취가 충분합니다.")}
+
+def test_chunk_targets_splits_on_size_duplicates_and_token_budget():
+    targets = [(i + 2, day(f"2026-01-{i + 1:02d}")) for i in range(5)]
+    assert [len(c) for c in diet._chunk_targets(targets, 2, 10**6)] == [2, 2, 1]
+
+    dup = targets[:2] + [(9, day("2026-01-01"))] # 같은 날짜가 두 번
+    assert [[t[0] for t in c] for c in diet._chunk_targets(dup, 7, 10**6)] == [[2, 3], [9]]
+
+    per_day = llm.estimate_tokens(diet._day_block(targets[0][1]))
+    chunks = diet._chunk_targets(targets, 7, per_day * 2)
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    big = [(2, day("2026-01-01", "마라탕 " * 500))] + targets[1:3]
+    assert [len(c) for c in diet._chunk_targets(big, 7, per_day * 2)] == [1, 2] # 예산을 넘는 하루는 혼자
+
+# 배열 응답에서 마지막 날짜를 빼먹는 모델
+class PartialModel(fakes.FakeModel):
+    def generate_content(self, prompt, **kwargs):
+        res = super().generate_content(prompt, **kwargs)
+        data = json.loads(res.text) if res.text.startswith("[") else None
+        if data and len(data) > 1: res.text = json.dumps(data[:-1], ensure_ascii=False)
+        return res
+
+def test_batch_score_rescores_days_missing_from_partial_reply(monkeypatch):
+    monkeypatch.setattr(genai, "GenerativeModel", PartialModel)
+    rows = [HEADER] + [day(f"2026-01-{i:02d}") for i in range(1, 4)]
+    client = fakes.FakeClient({"식단": rows})
+    db = database.DBHandler(client=client)
+    msg = diet.batch_score(db, rpm=10**6, use_cache=False, local_first=False)
+    assert msg.startswith("🎉 총 3건")
+    assert sum(PartialModel.stats.values()) == 2 # 묶음 1회 + 빠진 날짜 개별 1회
+    assert [r[7] for r in client.doc.sheets["식단"].rows[1:]] == ["85", "85", "85"]
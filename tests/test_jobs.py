@@ -0,0 +1,24 @@
+import time
+import jobs
+
+def wait_finished(job, timeout=2.0):
+    end = time.monotonic() + timeout
+    while job.active and time.monotonic() < end: time.sleep(0.01)
+    return job
+
+def test_submit_dedupes_active_key():
+    runner = jobs.JobRunner()
+    runner.register("slow", lambda job: time.sleep(0.1) or "ok")
+    first, created = runner.submit("slow")
+    second, again = runner.submit("slow")
+    assert created and not again and first is second
+    assert wait_finished(first).status == "done" and first.result == "ok"
+
+def test_close_stops_worker_after_queued_jobs():
+    runner = jobs.JobRunner()
+    runner.register("quick", lambda job: "ok")
+    job, _ = runner.submit("quick")
+    runner.close()
+    runner._thread.join(1.0)
+    assert not runner._thread.is_alive()
+    assert job.status == "done"
@@ -0,0 +1,22 @@
+import llm
+
+def test_cache_evicts_least_recently_used_over_budget(tmp_path):
+    cache = llm.ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=30)
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    cache.get("a") # a 가 최근 사용
+    cache.put("c", "x" * 10)
+    cache.put("d", "x" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c") and cache.get("d")
+    assert cache.total_bytes == 30
+
+def test_cache_total_survives_replace_and_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = llm.ResponseCache(path, max_bytes=100)
+    cache.put("a", "x" * 10)
+    cache.put("a", "x" * 4)
+    assert cache.total_bytes == 4
+    assert llm.ResponseCache(path).total_bytes == 4
+    cache.clear()
+    assert cache.total_bytes == 0
@@ -0,0 +1,22 @@
+import memory
+
+def test_incremental_norms_match_full_rebuild():
+    idx = memory.MemoryIndex()
+    for i in range(300): idx.add(f"사용자는 운동 기록 {i}" + " 스쿼트" * (i % 7))
+    full = memory.MemoryIndex()
+    full.facts, full.doc_len, full.total_len, full.postings = idx.facts, idx.doc_len, idx.total_len, idx.postings
+    full._avg_len = idx._avg_len
+    full._norms = [full._norm(dl) for dl in full.doc_len]
+    assert idx.search("스쿼트 기록") == full.search("스쿼트 기록")
+    # 평균 길이가 크게 바뀌면 전체를 다시 계산
+    for i in range(300): idx.add("아주 긴 기억 " * 20)
+    assert abs(idx._avg_len - idx.total_len / len(idx)) <= 0.1 * idx._avg_len
+    assert len(idx._norms) == len(idx)
+
+def test_common_terms_scan_recent_postings_only():
+    idx = memory.MemoryIndex(max_postings=50)
+    for i in range(500): idx.add(f"사용자는 운동을 했다 {i}")
+    idx.add("사용자는 무릎 통증이 있다")
+    assert idx.search("사용자는 무릎", k=1) == [500]
+    # 흔한 토큰만 있는 검색은 최근 기억 쪽에서 찾음
+    assert all(doc_id > 500 - 50 for doc_id in idx.search("사용자는 했다", k=8))
@@ -0,0 +1,62 @@
+import pytest
+import nutrition
+
+@pytest.mark.parametrize("text, expected", [
+    ("2/3공기", (2 / 3, "공기")),
+    ("200g", (200.0, "g")),
+    ("0.5kg", (500.0, "g")),
+    ("500ml", (500.0, "ml")),
+    ("1개 반", (1.5, "개")),
+    ("1개반", (1.5, "개")),
+    ("반 그릇", (0.5, "그릇")),
+    ("두 개", (2, "개")),
+    ("", (1.0, None)),
+    ("국물 버림", (1.0, None)),
+])
+def test_parse_amount(text, expected):
+    qty, unit = nutrition.parse_amount(text)
+    assert qty == pytest.approx(expected[0], abs=1e-3) and unit == expected[1]
+
+@pytest.mark.parametrize("name, expected", [
+    ("잡곡밥", "잡곡밥"),
+    ("흰 밥", "쌀밥"),
+    ("달걀", "계란"),
+    ("삶은 달걀", "계란"),
+    ("닭가슴쌀", "닭가슴살"), # 오타
+    ("제로콜라", "제로콜라"),
+    ("프로틴바", "프로틴바"),
+    # 다른 음식이 섞인 이름은 매칭하지 않음 (LLM 으로 넘김)
+    ("바나나우유", None),
+    ("닭가슴살볶음밥", None),
+    ("닭가슴살 샐러드", None),
+    ("김치볶음밥", None),
+    ("마라탕", None),
+])
+def test_match_food(name, expected):
+    assert nutrition.match_food(name) == expected
+
+def test_split_items_keeps_commas_inside_parentheses():
+    assert nutrition.split_items("잡곡밥(2/3공기), 라면(2/3개, 국물 버림) + 계란 2개") == [
+        ("잡곡밥(2/3공기)", "잡곡밥", "2/3공기"),
+        ("라면(2/3개, 국물 버림)", "라면", "2/3개, 국물 버림"),
+        ("계란 2개", "계란", "2개"),
+    ]
+
+def test_amount_before_note_parenthesis():
+    [(raw, name, amount)] = nutrition.split_items("라면 2/3개 (국물 버림)")
+    item = nutrition.estimate_item(raw, name, amount)
+    assert item.food == "라면" and item.servings == pytest.approx(2 / 3, abs=1e-3) and item.mitigated
+
+def test_unknown_item_leaves_day_incomplete():
+    day = nutrition.estimate_day(["바나나우유", "닭가슴살(200g)", "", "", ""])
+    assert not day.complete and day.unmatched == ["바나나우유"]
+
+def test_clean_day_scores_with_bonus():
+    day = nutrition.estimate_day(["계란(3개)", "잡곡밥(1공기), 닭가슴살(300g)", "그릭요거트(1개)", "닭가슴살(200g), 고구마(1개)", "프로틴(1스쿱)"])
+    assert day.complete
+    assert day.protein >= 140
+    assert day.score == 100 and ("자연식 위주 구성", 5) in day.deductions
+
+def test_refined_item_with_smaller_portion_halves_deduction():
+    day = nutrition.estimate_day(["라면(2/3개, 국물 버림)", "", "", "", ""])
+    assert ("정제 탄수화물/당류: 라면(2/3개, 국물 버림)", -5) in day.deductions
@@ -0,0 +1,63 @@
+import datetime
+import database
+import fakes
+import report
+
+WORKOUT_HEADER = ["날짜", "종목", "세트", "무게", "횟수", "1RM", "볼륨", "비고"]
+DIET_HEADER = ["날짜", "아침", "점심", "간식", "저녁", "보충제", "총합", "점수", "코멘트"]
+END = datetime.date(2026, 1, 14) # 이번 주 01-08 ~ 01-14, 지난주 01-01 ~ 01-07
+
+def sets(*rows):
+    return [WORKOUT_HEADER] + [[d, name, "3", w, r, "", "", ""] for d, name, w, r in rows]
+
+def make_db():
+    sheets = {
+        "등": sets(
+            ("2025-12-20", "데드리프트", "150", "5"), # 지난주 이전: 최고 기록에만 반영
+            ("2026-01-05", "데드리프트", "100", "5"), # 지난주
+            ("2026-01-10", "데드리프트", "100", "5"), # 이전 최고보다 낮음 -> 신기록 아님
+            ("2026-01-12", "렛풀다운", "50", "10"),    # 처음 하는 종목 -> 신기록
+            ("2026-01-15", "데드리프트", "200", "5"), # 기간 이후 -> 제외
+        ),
+        "가슴": sets(
+            ("2026-01-03", "벤치프레스", "80", "5"),
+            ("2026-01-09", "벤치프레스", "90", "5"),
+        ),
+        "하체": sets(("2025-11-01", "스쿼트", "100", "5")), # 두 주 모두 기록 없음
+        "식단": [DIET_HEADER,
+                 ["2026-01-06", "", "", "", "", "", "약 2000kcal (탄:200g, 단:100g, 지:60g)", "70", ""],
+                 ["2026-01-09", "", "", "", "", "", "약 1800kcal (탄:150g, 단:160g, 지:50g)", "90", ""],
+                 ["2026-01-13", "", "", "", "", "", "약 1600kcal (탄:120g, 단:140g, 지:40g)", "80", ""],
+                 ["2026-01-20", "", "", "", "", "", "약 3000kcal", "10", ""]],
+    }
+    return database.DBHandler(client=fakes.FakeClient(sheets))
+
+def test_weekly_summary_window_and_previous_week():
+    summary = report.weekly_summary(make_db(), end=END)
+    assert (summary["start"], summary["end"]) == ("2026-01-08", "2026-01-14")
+    assert summary["workout"]["등"] == {"sessions": 2, "sets": 6, "volume": 1000, "prev_volume": 500}
+    assert summary["workout"]["가슴"] == {"sessions": 1, "sets": 3, "volume": 450, "prev_volume": 400}
+    assert "하체" not in summary["workout"]
+
+def test_weekly_summary_reports_only_new_bests():
+    prs = {pr["exercise"]: pr for pr in report.weekly_summary(make_db(), end=END)["prs"]}
+    assert set(prs) == {"렛풀다운", "벤치프레스"}
+    assert prs["벤치프레스"]["prev_best"] == 90.0 and prs["벤치프레스"]["e1rm"] == 101.2
+    assert prs["렛풀다운"]["prev_best"] is None and prs["렛풀다운"]["date"] == "2026-01-12"
+
+def test_weekly_summary_diet_averages():
+    diet = report.weekly_summary(make_db(), end=END)["diet"]
+    assert diet["days_logged"] == 2
+    assert diet["avg_score"] == 85.0 and diet["prev_avg_score"] == 70.0
+    assert diet["macros_avg"]["protein"] == 150.0 and diet["macros_prev_avg"]["kcal"] == 2000.0
+    assert [d[0] for d in diet["daily"]] == ["01-09", "01-13"]
+
+def test_weekly_summary_reads_workout_store():
+    db = make_db()
+    report.weekly_summary(db, end=END)
+    db.append_workout("하체", ["2026-01-13", "스쿼트", "3", "100", "5", "", "", ""]) # 열 저장소에 바로 반영
+    summary = report.weekly_summary(db, end=END)
+    assert summary["workout"]["하체"] == {"sessions": 1, "sets": 3, "volume": 500, "prev_volume": 0}
+    assert summary["workout"]["등"]["volume"] == 1000
+    db.invalidate("하체") # 원격 기준으로 바뀐 운동 시트 -> 다음 조회 때 저장소를 다시 적재
+    assert db._workout_store is None
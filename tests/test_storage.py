@@ -0,0 +1,191 @@
+import pytest
+import database
+import fakes
+import storage
+
+HEADER = ["날짜", "아침", "점심", "간식", "저녁"]
+DAY = "2026-01-01"
+
+def make_client():
+    return fakes.FakeClient({"식단": [HEADER, [DAY, "", "", "", ""]]})
+
+# 백그라운드 스레드 없이 sync_once 를 직접 호출
+def make_db(client, path):
+    db = database.DBHandler(client=client, local_path=str(path), sync=False)
+    return db, storage.Syncer(db.backend, db.remote)
+
+def remote_rows(client):
+    return client.doc.sheets["식단"].rows
+
+def test_local_write_is_replicated(tmp_path):
+    client = make_client()
+    db, syncer = make_db(client, tmp_path / "local.db")
+    db.get_all_values("식단") # 최초 1회 원격에서 받아 옴
+    client.api.reset()
+    assert db.append_row("식단", ["2026-01-02", "죽"]) == "success"
+    db.update_cell("식단", 2, 2, "밥")
+    assert sum(client.api.calls.values()) == 0 # 로컬에만 반영
+    assert syncer.sync_once() == 2
+    assert remote_rows(client)[1][1] == "밥"
+    assert remote_rows(client)[2][:2] == ["2026-01-02", "죽"]
+    assert db.sync_status() is None and syncer.status()["pending"] == 0
+
+def test_resume_after_failure_does_not_duplicate_rows(tmp_path):
+    client = make_client()
+    path = tmp_path / "local.db"
+    db, syncer = make_db(client, path)
+    db.append_row("식단", ["2026-01-02", "죽"])
+    db.update_cell("식단", 2, 2, "밥")
+
+    # 행 추가는 반영됐지만 셀 쓰기(batch_update)에서 실패
+    ws = client.doc.sheets["식단"]
+    update = ws.batch_update
+    def fail(*args, **kwargs): raise fakes.FakeAPIError(429, "Quota exceeded")
+    ws.batch_update = fail
+    try: syncer.sync_once()
+    except fakes.FakeAPIError: pass
+    assert syncer.status()["pending"] == 2
+    assert len(remote_rows(client)) == 3
+
+    # 재시작: 같은 로컬 파일을 새 엔진으로 열어 outbox 부터 이어서 처리
+    ws.batch_update = update
+    local = storage.LocalBackend(str(path), db.remote)
+    assert storage.Syncer(local, db.remote).sync_once() == 2
+    assert local.status() == {"pending": 0, "conflicts": 0}
+    assert len(remote_rows(client)) == 3
+    assert remote_rows(client)[1][1] == "밥"
+
+def test_cell_conflict_keeps_remote_value_and_refreshes_handler(tmp_path):
+    client = make_client()
+    db, syncer = make_db(client, tmp_path / "local.db")
+    assert db.find_row("식단", DAY)[1][2] == "" # 스냅샷/인덱스 적재
+    db.update_cell("식단", 2, 3, "김밥")
+    remote_rows(client)[1][2] = "비빔밥" # 다른 곳에서 같은 셀 수정
+
+    syncer.sync_once()
+    assert syncer.status()["conflicts"] == 1
+    assert remote_rows(client)[1][2] == "비빔밥"
+    assert syncer.refresh() == 1 # 충돌 시트는 다음 단계에서 원격으로 다시 받음
+
+    # 다음 기록은 원격 값을 기준으로 이어 붙여야 함 (오래된 인덱스 값으로 덮어쓰지 않음)
+    row, values = db.find_row("식단", DAY)
+    assert values[2] == "비빔밥"
+    db.update_cell("식단", row, 3, values[2] + ", 사과")
+    syncer.sync_once()
+    assert remote_rows(client)[1][2] == "비빔밥, 사과"
+    assert syncer.status()["conflicts"] == 1
+
+def test_row_drift_is_recorded_and_handler_rereads(tmp_path):
+    client = make_client()
+    db, syncer = make_db(client, tmp_path / "local.db")
+    db.find_row("식단", DAY)
+    remote_rows(client).append(["2026-01-02", "원격"]) # 다른 곳에서 행 추가
+    db.append_row("식단", ["2026-01-03", "로컬"])
+
+    syncer.sync_once()
+    syncer.refresh()
+    status = syncer.status()
+    assert status["conflicts"] == 1
+    assert [r[0] for r in remote_rows(client)[1:]] == [DAY, "2026-01-02", "2026-01-03"]
+
+    # 로컬 사본/인덱스가 원격 기준으로 다시 만들어져 새 행 위치가 맞아야 함
+    assert db.find_row("식단", "2026-01-03")[0] == 4
+    assert db.find_row("식단", "2026-01-02")[1][1] == "원격"
+    db.update_cell("식단", 4, 3, "점심")
+    syncer.sync_once()
+    assert remote_rows(client)[3][:3] == ["2026-01-03", "로컬", "점심"]
+
+def test_failing_sheet_does_not_block_other_sheets(tmp_path):
+    client = fakes.FakeClient({"식단": [HEADER, [DAY, "", "", "", ""]], "기억_DB": [["날짜", "내용"]]})
+    db, syncer = make_db(client, tmp_path / "local.db")
+    db.save_memory("무릎이 안 좋음")
+    db.update_cell("식단", 2, 2, "밥")
+    # 기억_DB 가 원격에서 삭제됨
+    def missing(*args, **kwargs): raise fakes.FakeAPIError(404, "WorksheetNotFound: 기억_DB")
+    client.doc.sheets["기억_DB"].get_all_values = missing
+
+    assert syncer.sync_once() == 1
+    assert remote_rows(client)[1][1] == "밥"
+    status = syncer.status()
+    assert status["pending"] == 1 and "기억_DB" in status["sheet_errors"]
+    assert status["last_error"] is None
+
+    # 대기 중인 시트는 건너뛰고 다른 시트 쓰기는 계속 반영
+    db.update_cell("식단", 2, 3, "국")
+    assert syncer.sync_once() == 1
+    assert remote_rows(client)[1][2] == "국"
+
+    # 모든 시트가 실패한 주기만 예외 (전체 재시도 간격 증가)
+    syncer.sheet_errors["기억_DB"]["retry_at"] = 0
+    with pytest.raises(fakes.FakeAPIError): syncer.sync_once()
+
+def test_writes_do_not_wait_on_remote_refresh(tmp_path):
+    client = make_client()
+    db, syncer = make_db(client, tmp_path / "local.db")
+    db.get_all_values("식단")
+    db.backend.refresh_after = 0 # 다시 받을 때가 지남
+    db.invalidate()
+    client.api.reset()
+    db.update_cell("식단", 2, 2, "밥")
+    assert db.get_all_values("식단")[1][1] == "밥"
+    assert sum(client.api.calls.values()) == 0 # 쓰기/읽기는 로컬에서만
+
+    syncer.sync_once()
+    remote_rows(client)[1][3] = "사과" # 원격에서 직접 수정
+    assert syncer.refresh() == 1
+    assert db.get_all_values("식단")[1][3] == "사과"
+
+    # 다시 받기에 실패하면 그 시트만 대기 (매 주기/쓰기마다 재시도하지 않음)
+    ws = client.doc.sheets["식단"]
+    def fail(*args, **kwargs): raise fakes.FakeAPIError(503, "unavailable")
+    ws.get_all_values = fail
+    assert syncer.refresh() == 0
+    assert "식단" in syncer.status()["sheet_errors"]
+    client.api.reset()
+    assert syncer.refresh() == 0 and sum(client.api.calls.values()) == 0
+    db.update_cell("식단", 2, 5, "닭가슴살")
+    assert sum(client.api.calls.values()) == 0
+
+def test_updates_after_drifted_append_follow_the_row(tmp_path):
+    client = make_client()
+    db, syncer = make_db(client, tmp_path / "local.db")
+    db.get_all_values("식단")
+    remote_rows(client).append(["2026-01-02", "원격"]) # 다른 곳에서 행 추가
+    # log_diet 패턴: 첫 끼는 오늘 행 추가, 이후 끼니는 그 행 수정
+    db.append_row("식단", ["2026-01-03", "로컬아침", "", "", ""])
+    db.update_cell("식단", 3, 3, "로컬점심")
+    syncer.sync_once()
+    # 같은 주기 뿐 아니라 로컬 사본을 다시 받기 전의 다음 주기 쓰기도 원격 위치로
+    db.update_cell("식단", 3, 5, "로컬저녁")
+    db.update_range("식단", 3, 4, [["로컬간식"]])
+    syncer.sync_once()
+
+    assert remote_rows(client)[2] == ["2026-01-02", "원격"]
+    assert remote_rows(client)[3] == ["2026-01-03", "로컬아침", "로컬점심", "로컬간식", "로컬저녁"]
+    assert syncer.status()["conflicts"] == 1
+
+    # 다시 받은 뒤에는 원격 행 번호 그대로
+    assert syncer.refresh() == 1
+    row, values = db.find_row("식단", "2026-01-03")
+    assert row == 4 and values[4] == "로컬저녁"
+    db.update_cell("식단", row, 2, "로컬아침, 사과")
+    syncer.sync_once()
+    assert remote_rows(client)[3][1] == "로컬아침, 사과"
+
+def test_drifted_append_is_not_repeated_on_resume(tmp_path):
+    client = make_client()
+    db, syncer = make_db(client, tmp_path / "local.db")
+    db.get_all_values("식단")
+    remote_rows(client).append(["2026-01-02", "원격"])
+    db.append_row("식단", ["2026-01-03", "로컬"])
+    db.update_cell("식단", 3, 3, "점심")
+    ws = client.doc.sheets["식단"]
+    update = ws.batch_update
+    def fail(*args, **kwargs): raise fakes.FakeAPIError(429, "Quota exceeded")
+    ws.batch_update = fail
+    with pytest.raises(fakes.FakeAPIError): syncer.sync_once() # 행 추가 후 셀 쓰기에서 실패
+    ws.batch_update = update
+    syncer.sheet_errors.clear()
+    syncer.sync_once()
+    assert [r[0] for r in remote_rows(client)[1:]] == [DAY, "2026-01-02", "2026-01-03"]
+    assert remote_rows(client)[3][:3] == ["2026-01-03", "로컬", "점심"]
@@ -0,0 +1,49 @@
+import threading
+import time
+import fakes
+import database
+import workout
+
+HEADER = ["날짜", "종목", "세트", "무게", "횟수", "1RM", "볼륨", "비고"]
+
+def make_db(n=30):
+    rows = [HEADER] + [[f"2026-01-{i % 28 + 1:02d}", "벤치프레스", "5", "100", "5", "", "", ""] for i in range(n)]
+    client = fakes.FakeClient({sheet: [list(r) for r in rows] for sheet in workout.SHEET_LIST})
+    return database.DBHandler(client=client), client
+
+def test_batch_calculate_fills_volume_and_1rm():
+    db, client = make_db()
+    assert workout.batch_calculate(db).startswith("✅ 210건")
+    row = client.doc.sheets["등"].rows[1]
+    assert row[5:7] == ["112.5", "500"]
+    assert db.get_state("watermark:등:stats") == 31
+    assert workout.batch_calculate(db).startswith("✅ 0건") # 워터마크 이후만 다시 계산
+
+def test_batch_calculate_keeps_watermark_when_flush_fails():
+    db, client = make_db()
+    ws = client.doc.sheets["가슴"]
+    update = ws.batch_update
+    def fail(*args, **kwargs): raise fakes.FakeAPIError(429, "Quota exceeded")
+    ws.batch_update = fail
+
+    msg = workout.batch_calculate(db) # 예외 없이 결과 메시지로 보고
+    assert msg.startswith("✅ 180건") and "가슴" in msg
+    assert db.get_state("watermark:가슴:stats") is None
+    assert db.get_state("watermark:등:stats") == 31
+
+    ws.batch_update = update
+    assert workout.batch_calculate(db).startswith("✅ 30건")
+    assert all(r[6] == "500" for r in ws.rows[1:])
+
+def test_log_workout_during_store_load_is_counted_once():
+    db, client = make_db()
+    client.api.latency = 0.01 # 최초 로드가 시트 9개를 읽는 동안 기록이 끼어들도록
+    loader = threading.Thread(target=db.workout_store)
+    loader.start()
+    time.sleep(0.03)
+    assert workout.log_workout(db, "가슴", "벤치프레스", "5", "100", "5") == "success"
+    loader.join()
+    store = db.workout_store()
+    assert len(store) == 7 * 30 + 1
+    assert workout.log_workout(db, "등", "데드리프트", "5", "140", "3") == "success"
+    assert len(store) == 7 * 30 + 2
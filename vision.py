@@ -0,0 +1,19 @@
+import hashlib
+import io
+from PIL import Image, ImageOps
+
+# 업로드 바이트 -> (축소된 PIL 이미지, 전송용 JPEG 바이트, 원본 내용 해시). 디코딩은 1회만
+def prepare_image(data, max_side=1024, quality=85):
+    img = Image.open(io.BytesIO(data))
+    img = ImageOps.exif_transpose(img).convert("RGB") # 휴대폰 사진 회전 정보 반영
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return img, buf.getvalue(), hashlib.sha256(data).hexdigest()
+
+# 같은 사진(해시)에 대해 이전에 받은 식단 분석 결과 (db 작업 상태 저장소에 보관)
+def cached_analysis(db, img_hash):
+    return db.get_state(f"vision:{img_hash}")
+
+def save_analysis(db, img_hash, text):
+    if text: db.set_state(f"vision:{img_hash}", text)
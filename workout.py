@@ -1,7 +1,8 @@
 import datetime
 import re
-import time
+import numpy as np
 import google.generativeai as genai
+import llm
 
 # 운동 기록 함수
 def log_workout(db, target_sheet, exercise, sets, weight, reps):
@@ -11,39 +12,115 @@ def log_workout(db, target_sheet, exercise, sets, weight, reps):
     today = datetime.datetime.now().strftime("%Y-%m-%d")
     # [날짜, 종목, 세트, 무게, 횟수, 1RM, 볼륨, 비고]
     row_data = [today, exercise, sets, weight, reps, "", "", ""]
-    return db.append_row(target_sheet, row_data)
+    return db.append_workout(target_sheet, row_data) # 열 저장소가 이미 로드돼 있으면 이 기록도 추가
 
-# [핵심] 운동 통계(볼륨, 1RM) 일괄 계산 함수
-def batch_calculate(db, model_name="gemini-2.5-flash"):
-    sheet_list = ["등", "가슴", "하체", "어깨", "이두", "삼두", "복근"]
+SHEET_LIST = ["등", "가슴", "하체", "어깨", "이두", "삼두", "복근"]
+ALL_SHEETS = SHEET_LIST + ["유산소", "기타"] # 통계 시트 + 볼륨 없는 유산소/기타
+
+# 한 줄에 한 셀씩, 첫 번째 숫자만 추출 (숫자가 없으면 빈 문자열)
+_FIRST_NUM = re.compile(r"^[^\d\n]*(\d+(?:\.\d+)?)?[^\n]*$", re.M)
+
+# 문자열 열 전체를 한 번의 정규식 스캔으로 float 배열로 변환 (파싱 불가 -> nan)
+def parse_column(values):
+    nums = _FIRST_NUM.findall("\n".join(v.replace("\n", " ") for v in values))
+    return np.array([n or "nan" for n in nums], dtype=float)
+
+# 볼륨 = 무게 x 횟수, 1RM 추정: 10회 이하 Brzycki, 그 이상 Epley (1회면 무게 그대로)
+def compute_stats(weights, reps):
+    w, r = parse_column(weights), parse_column(reps)
+    vol = w * r
+    with np.errstate(divide="ignore", invalid="ignore"):
+        brzycki = w * 36 / (37 - r)
+        epley = w * (1 + r / 30)
+    e1rm = np.where(r <= 1, w, np.where(r <= 10, brzycki, epley))
+    valid = (w > 0) & (r > 0)
+    return vol, e1rm, valid
+
+def _header_index(header):
+    return {
+        "w": header.index("무게"), "r": header.index("횟수"),
+        "orm": header.index("1RM"), "vol": header.index("볼륨"),
+        "note": next(i for i, h in enumerate(header) if "비고" in h),
+    }
+
+# [핵심] 운동 통계(볼륨, 1RM) 일괄 계산 함수 - 시트 전체를 열 단위로 한 번에 계산하고 범위 1회 쓰기
+# 시트별 워터마크(처리 완료된 마지막 행) 이후 + 안전 구간(safety_window행)만 읽음. full_rescan=True 면 처음부터 전부
+# 시트 1개 끝날 때마다 기록을 먼저 반영하고 그다음 워터마크 저장 (반영 실패 시 워터마크를 그대로 두어 다음 실행 때 다시 계산)
+# job(jobs.Job)이 주어지면 시트 사이에서 진행 상황 보고 + 취소 확인
+def batch_calculate(db, with_notes=False, model_name="gemini-2.5-flash", use_cache=True, full_rescan=False, safety_window=20, job=None):
+    count, failed = 0, []
+    with db.batch():
+        for n, sheet in enumerate(SHEET_LIST):
+            if job:
+                job.check()
+                job.update(done=n, total=len(SHEET_LIST), message=f"{sheet} 계산 중")
+            try:
+                wm_key = f"watermark:{sheet}:stats"
+                start_row = 2 if full_rescan else max(2, db.get_state(wm_key, 1) - safety_window + 1)
+                header, body = db.get_rows(sheet, start_row)
+                if not header: continue
+                idx = _header_index(header)
+                if not body:
+                    db.set_state(wm_key, start_row - 1)
+                    continue
+                width = max(idx.values()) + 1
+                body = [row + [""] * (width - len(row)) for row in body]
+
+                vol, e1rm, valid = compute_stats([row[idx["w"]] for row in body], [row[idx["r"]] for row in body])
+                old_vol = [row[idx["vol"]] for row in body]
+                old_orm = [row[idx["orm"]] for row in body]
+                new_vol = [int(v) if ok else old for v, ok, old in zip(vol, valid, old_vol)]
+                new_orm = [round(float(x), 1) if ok else old for x, ok, old in zip(e1rm, valid, old_orm)]
+                added = sum(1 for ok, old in zip(valid, old_vol) if ok and not old)
+
+                # 두 열이 붙어 있으면 범위 1개, 아니면 범위 2개를 같은 batch_update 호출로 전송
+                lo, hi = sorted([idx["orm"], idx["vol"]])
+                if hi - lo == 1:
+                    cols = (new_orm, new_vol) if idx["orm"] < idx["vol"] else (new_vol, new_orm)
+                    db.update_range(sheet, start_row, lo + 1, [list(pair) for pair in zip(*cols)])
+                else:
+                    db.update_range(sheet, start_row, idx["orm"] + 1, [[x] for x in new_orm])
+                    db.update_range(sheet, start_row, idx["vol"] + 1, [[v] for v in new_vol])
+                db.flush(sheet)
+                db.set_state(wm_key, start_row + len(body) - 1)
+                count += added
+            except:
+                failed.append(sheet)
+                continue
+
+    if with_notes: count_notes = generate_notes(db, model_name, use_cache, job=job)
+    msg = f"✅ {count}건 운동 통계 업데이트 완료" + (f" (코멘트 {count_notes}건)" if with_notes else "")
+    if failed: msg += f"\n⚠️ {', '.join(failed)} 시트 반영 실패 (다음 실행 때 다시 계산)"
+    return msg
+
+# [선택] 코치 코멘트 생성 단계 - 통계와 분리 (LLM 호출이 느리므로 필요할 때만 실행)
+# job 이 주어지면 행마다 기록 반영(이미 코멘트가 있는 행은 건너뛰므로 재실행 시 이어서 처리) + 취소 확인
+def generate_notes(db, model_name="gemini-2.5-flash", use_cache=True, job=None):
     count = 0
     model = genai.GenerativeModel(model_name)
-    
-    for sheet in sheet_list:
-        try:
-            rows = db.get_all_values(sheet)
-            header = rows[0]
-            idx_w = header.index("무게")
-            idx_r = header.index("횟수")
-            idx_vol = header.index("볼륨")
-            idx_note = next(i for i, h in enumerate(header) if "비고" in h)
-            
-            for i, row in enumerate(rows[1:], start=2):
-                if (len(row)<=idx_vol or not row[idx_vol]) and row[idx_w] and row[idx_r]:
+    limiter = llm.RateLimiter(rpm=120, burst=1) # LLM 호출 간격 (캐시 적중 시엔 대기 없음)
+    with db.batch():
+        for n, sheet in enumerate(SHEET_LIST):
+            if job and job.cancelled: break
+            if job: job.update(done=n, total=len(SHEET_LIST), message=f"{sheet} 코멘트 작성 중")
+            try:
+                rows = db.get_all_values(sheet)
+                if len(rows) < 2: continue
+                idx = _header_index(rows[0])
+                width = max(idx.values()) + 1
+                body = [row + [""] * (width - len(row)) for row in rows[1:]]
+                w, r = parse_column([row[idx["w"]] for row in body]), parse_column([row[idx["r"]] for row in body])
+
+                for i, row in enumerate(body, start=2):
+                    if row[idx["note"]] or not (w[i-2] > 0 and r[i-2] > 0): continue
+                    if job and job.cancelled: break
                     try:
-                        # 숫자만 추출해서 계산
-                        w = float(re.findall(r"[\d\.]+", row[idx_w])[0])
-                        r = float(re.findall(r"[\d\.]+", row[idx_r])[0])
-                        vol = int(w * r) # (단순 계산)
-                        db.update_cell(sheet, i, idx_vol+1, vol)
-                        
-                        # 코멘트 없으면 추가
-                        if not row[idx_note]:
-                            prompt = f"헬스 코치 피드백(존댓말). 종목:{row[1]}, {w}kg {r}회."
-                            res = model.generate_content(prompt)
-                            db.update_cell(sheet, i, idx_note+1, res.text.strip())
+                        prompt = f"헬스 코치 피드백(존댓말). 종목:{row[1]}, {w[i-2]}kg {r[i-2]}회."
+                        res = llm.generate(model, prompt, limiter=limiter, use_cache=use_cache)
+                        db.update_cell(sheet, i, idx["note"]+1, res.strip())
+                        if job: db.flush(sheet)
                         count += 1
-                        time.sleep(0.5)
                     except: continue
-        except: continue
-    return f"✅ {count}건 운동 통계 업데이트 완료"
\ No newline at end of file
+                db.flush(sheet) # 반영 실패는 이 시트만 건너뜀 (코멘트가 빈 행은 다음 실행 때 다시 작성)
+            except: continue
+    return count